@@ -11,43 +11,77 @@ from homeassistant.config_entries import (
 )
 from homeassistant.core import HomeAssistant
 from homeassistant import exceptions
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.typing import ConfigType
 
 from . import lijst
 from .const import DOMAIN
+from .services import async_setup_services
 
 LOGGER: logging.Logger = logging.getLogger(__package__)
 LOGGER.setLevel(10)
 _LOGGER = logging.getLogger(__name__)
 # List of platforms to support. There should be a matching .py file for each,
 # eg <cover.py> and <sensor.py>
-PLATFORMS: list[str] = ["sensor"]
+PLATFORMS: list[str] = ["sensor", "todo", "calendar"]
+
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Set up the Eetlijst services."""
+    async_setup_services(hass)
+    return True
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up Eetlijst from a config entry."""
 
-    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = lijst.LijstCoordinator(
-        hass, entry, entry.data
-    )
+    coordinator = lijst.LijstCoordinator(hass, entry, entry.data)
 
     entry.async_on_unload(entry.add_update_listener(lijst.options_update_listener))
 
-    (valid, resp) = await lijst.test_token(entry.data["token"])
-    if not valid:
-        LOGGER.error(
-            f"Error validating eetlijst connection. Got response {resp}. Try updating the JWT token."
-        )
-        raise ConfigEntryAuthFailed(f"Credentials expired for {entry.data['title']}")
+    if coordinator.token_expired():
+        raise ConfigEntryAuthFailed(f"Token expired for {entry.data['title']}")
+
+    # With a snapshot cache the token is checked by the background refresh instead,
+    # which starts a reauth flow itself when the token is no longer valid
+    if not await coordinator.async_load_snapshot():
+        (valid, resp) = await lijst.test_token(hass, entry.data["token"])
+        if not valid:
+            LOGGER.error(
+                f"Error validating eetlijst connection. Got response {resp}. Try updating the JWT token."
+            )
+            raise ConfigEntryAuthFailed(
+                f"Credentials expired for {entry.data['title']}"
+            )
+        # The data is needed by every platform before their entities are added.
+        # Together with the token check this is the whole cold start, two
+        # requests, so the platforms add their entities without updating them.
+        await coordinator.setuplijst()
+        await coordinator.async_config_entry_first_refresh()
+    else:
+        # Entities are created from the snapshot cache, the API catches up later
+        hass.async_create_task(coordinator.async_refresh())
     # entry.async_start_reauth()
 
     # if "lijst_dev_id" not in entry.data:
     #     print("Setting eetlijst device id")
     #     await lijst.options_update_listener(hass, entry)
     # print(f"Eetlijst has entry data {entry.data} and id {entry.entry_id}")
+    # Only entries that are set up are used by the platforms and services
+    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = coordinator
     for pltform in PLATFORMS:
         hass.async_create_task(
             hass.config_entries.async_forward_entry_setup(entry, pltform)
         )
+
+    coordinator.subscription.async_start()
+    entry.async_on_unload(coordinator.subscription.async_stop)
+    entry.async_on_unload(coordinator.async_setup_scheduler())
+    entry.async_on_unload(coordinator.async_setup_day_rollover())
+    entry.async_on_unload(coordinator.async_setup_token_expiry())
+    entry.async_on_unload(coordinator.async_cancel_future_pages)
     return True
 
 
@@ -63,6 +97,11 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     return unload_ok
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the snapshot cache of a removed entry."""
+    await lijst.snapshot_store(hass, entry.entry_id).async_remove()
+
+
 async def async_migrate_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> bool:
     """Migrate old entry."""
     _LOGGER.debug("Migrating Eetlijst from config version %s", config_entry.version)
@@ -0,0 +1,178 @@
+"""Process-wide broker for the requests sent to the Eetlijst API.
+
+Config entries with the same token send the same documents with the same
+variables. The broker merges identical requests that are in flight and hands a
+recent response to every caller within the freshness window, so duplicate
+entries do not add any load on the API. Requests with different tokens are
+never merged, even for the same group, as the response depends on what the
+token may see.
+
+The circuit breaker is shared the same way: once the API keeps failing, no
+entry sends requests until the cooldown has passed.
+"""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import random
+import time
+
+from .const import (
+    CIRCUIT_COOLDOWN,
+    CIRCUIT_COOLDOWN_MAX,
+    CIRCUIT_FAILURES,
+    REQUEST_FRESHNESS,
+    RETRY_BACKOFF,
+    RETRY_BACKOFF_MAX,
+)
+
+
+class ApiUnavailable(Exception):
+    """Error to indicate the API is overloaded, unreachable or not answering.
+
+    retry_after is the number of seconds before a new request makes sense.
+    """
+
+    def __init__(self, message: str, retry_after: float = 0) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with jitter before retry number attempt."""
+    delay = min(RETRY_BACKOFF * 2 ** (attempt - 1), RETRY_BACKOFF_MAX)
+    return delay * (1 + random.random()) / 2
+
+
+def retry_after_seconds(value: str | None) -> float | None:
+    """Parse a Retry-After header, in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class CircuitBreaker:
+    """Stops all requests for a while once the API keeps failing.
+
+    Once the cooldown has passed the circuit is half-open: a single probe
+    request is let through while the others keep getting ApiUnavailable,
+    until the probe succeeded or failed. A probe that never reports back is
+    replaced after the minimum cooldown.
+    """
+
+    def __init__(
+        self,
+        threshold: int = CIRCUIT_FAILURES,
+        cooldown: float = CIRCUIT_COOLDOWN,
+        cooldown_max: float = CIRCUIT_COOLDOWN_MAX,
+    ) -> None:
+        self.threshold = threshold
+        self.cooldown_min = cooldown
+        self.cooldown_max = cooldown_max
+        self.failures = 0
+        self._cooldown = cooldown
+        self._open_until = 0.0
+        self._probe_until = 0.0
+        self.probing = False
+
+    @property
+    def retry_in(self) -> float:
+        """Seconds until requests are let through again."""
+        return max(0.0, self._open_until - time.monotonic())
+
+    def check(self) -> None:
+        """Raise ApiUnavailable while the circuit is open."""
+        retry_in = self.retry_in
+        if retry_in > 0:
+            raise ApiUnavailable(
+                f"Eetlijst API requests paused for {retry_in:.0f}s", retry_in
+            )
+        if self.failures < self.threshold:
+            return
+        now = time.monotonic()
+        if now < self._probe_until:
+            raise ApiUnavailable(
+                "Eetlijst API requests paused until a probe succeeds",
+                self._probe_until - now,
+            )
+        self._probe_until = now + self.cooldown_min
+        self.probing = True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._cooldown = self.cooldown_min
+        self._open_until = 0.0
+        self._probe_until = 0.0
+        self.probing = False
+
+    def record_failure(self, retry_after: float | None = None) -> None:
+        """Count a failed request, opening the circuit when needed.
+
+        When the probe of a half-open circuit fails, the circuit opens again
+        for twice as long.
+        """
+        now = time.monotonic()
+        self._probe_until = 0.0
+        self.probing = False
+        self.failures += 1
+        if retry_after:
+            self._open_until = max(self._open_until, now + retry_after)
+        if self.failures >= self.threshold:
+            self._open_until = max(self._open_until, now + self._cooldown)
+            self._cooldown = min(self._cooldown * 2, self.cooldown_max)
+
+
+class RequestBroker:
+    """Coalesces identical requests, keyed by (token, query, variables)."""
+
+    def __init__(self, freshness: float = REQUEST_FRESHNESS) -> None:
+        self.freshness = freshness
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        self._recent: dict[tuple, tuple[float, tuple]] = {}
+
+    async def async_request(self, key: tuple, fetch, max_age: float | None = None):
+        """Return the result of fetch(), shared with identical requests.
+
+        fetch is a coroutine function returning (status, body). Only successful
+        results without GraphQL errors are kept for the freshness window,
+        max_age narrows the window for a caller that needs a newer result.
+        """
+        max_age = self.freshness if max_age is None else min(max_age, self.freshness)
+        recent = self._recent.get(key)
+        if recent is not None and time.monotonic() - recent[0] <= max_age:
+            return recent[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        # A caller that is cancelled does not cancel the request of the others
+        return await asyncio.shield(task)
+
+    def _finished(self, key: tuple, task: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        now = time.monotonic()
+        for old_key, (stored_at, _) in list(self._recent.items()):
+            if now - stored_at > self.freshness:
+                del self._recent[old_key]
+        (status, body) = task.result()
+        if status == 200 and b'"errors"' not in body:
+            self._recent[key] = (now, (status, body))
+
+
+REQUEST_BROKER = RequestBroker()
+CIRCUIT_BREAKER = CircuitBreaker()
@@ -0,0 +1,91 @@
+"""Date indexed cache of the Eetlijst events, for the calendar.
+
+The cache knows which date ranges it holds, so a calendar view only fetches
+the days it has not seen before. Ranges of past days never expire, ranges of
+today and later are fetched again once they are older than the ttl. The range
+covered by the future dataset is kept up to date by every refresh.
+
+This module has no Home Assistant dependencies.
+"""
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta
+
+from .model import Event
+
+
+class EventCache:
+    """Events per date with the date ranges they are complete for."""
+
+    def __init__(self, ttl: timedelta) -> None:
+        self.ttl = ttl
+        self._events: dict[date, Event] = {}
+        self._dates: list[date] = []
+        # Sorted, non-overlapping (start, end, fetched_at), end exclusive
+        self._ranges: list[tuple[date, date, datetime]] = []
+
+    def missing(
+        self, start: date, end: date, now: datetime, today: date
+    ) -> list[tuple[date, date]]:
+        """The parts of [start, end) that are not cached or have expired."""
+        gaps = []
+        cursor = start
+        for (range_start, range_end, fetched_at) in self._ranges:
+            if range_end <= cursor:
+                continue
+            if range_start >= end:
+                break
+            if range_end > today and now - fetched_at >= self.ttl:
+                continue
+            if range_start > cursor:
+                gaps.append((cursor, range_start))
+            cursor = max(cursor, range_end)
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def store(self, start: date, end: date, events, now: datetime) -> None:
+        """Replace the events of [start, end), which are complete for that range."""
+        if start >= end:
+            return
+        first = bisect_left(self._dates, start)
+        last = bisect_left(self._dates, end)
+        for day in self._dates[first:last]:
+            del self._events[day]
+        del self._dates[first:last]
+        for event in events:
+            day = event.start_date.date()
+            if not start <= day < end:
+                continue
+            if day not in self._events:
+                insort(self._dates, day)
+            self._events[day] = event
+
+        ranges = []
+        for (range_start, range_end, fetched_at) in self._ranges:
+            # Keep the parts of the ranges outside of the stored one
+            if range_start < start:
+                ranges.append((range_start, min(range_end, start), fetched_at))
+            if range_end > end:
+                ranges.append((max(range_start, end), range_end, fetched_at))
+        ranges.append((start, end, now))
+        self._ranges = sorted(ranges)
+
+    def events(self, start: date, end: date) -> list[Event]:
+        """The cached events of [start, end), by date."""
+        first = bisect_left(self._dates, start)
+        last = bisect_left(self._dates, end)
+        return [self._events[day] for day in self._dates[first:last]]
+
+
+def covered_until(today: date, horizon: int, events, page_size: int) -> date:
+    """End of the range the future dataset is complete for.
+
+    While the later pages are still being fetched the future ends at its last
+    event, so only the days up to it count as covered.
+    """
+    until = today + timedelta(days=horizon)
+    if events and len(events) % page_size == 0:
+        until = min(until, events[-1].start_date.date() + timedelta(days=1))
+    return until
@@ -0,0 +1,112 @@
+"""Platform for calendar integration."""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from homeassistant.components.calendar import CalendarEntity, CalendarEvent
+from homeassistant.core import callback
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN
+from .model import AttendanceStatus
+from .sensor import SensorBase
+
+
+async def async_setup_entry(hass, config_entry, async_add_entities):
+    """Add a dinner calendar per group for passed config_entry in HA."""
+    lijst = hass.data[DOMAIN][config_entry.entry_id]
+    async_add_entities(
+        [EetlijstCalendar(lijst, group_id) for group_id in lijst.groups]
+    )
+
+
+class EetlijstCalendar(SensorBase, CalendarEntity):
+    """The dinners of a group as all-day events.
+
+    Views of the calendar are answered from the coordinator's event cache,
+    only days it does not hold are fetched.
+    """
+
+    def __init__(self, eetlijst, group_id):
+        """Initialize the calendar."""
+        super().__init__(eetlijst, group_id)
+        self._attr_unique_id = f"{self._device_id}_calendar"
+        self._attr_name = f"Eetlijst {self._lijst_name} Dinner"
+        self._attr_icon = "mdi:silverware-fork-knife"
+        self._event = None
+
+    @property
+    def event(self) -> CalendarEvent | None:
+        """The dinner of today, or the next one."""
+        return self._event
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
+        if self.async_group_missing():
+            return
+        lijst = self.lijst_data
+        today = self.coordinator.today()
+        events = [lijst.today] if lijst.today is not None else []
+        events.extend(lijst.future)
+        upcoming = [event for event in events if event.start_date.date() >= today]
+        if upcoming:
+            self._event = self.calendar_event(
+                min(upcoming, key=lambda event: event.start_date)
+            )
+        else:
+            self._event = None
+        self.async_write_ha_state_if_changed()
+
+    async def async_get_events(
+        self, hass, start_date: datetime, end_date: datetime
+    ) -> list[CalendarEvent]:
+        """Return the dinners between start_date and end_date."""
+        start = dt_util.as_local(start_date).date()
+        # The day of end_date only counts when the range reaches into it
+        end = dt_util.as_local(end_date - timedelta(microseconds=1)).date()
+        events = await self.coordinator.async_get_events(
+            self._group_id, start, end + timedelta(days=1)
+        )
+        return [self.calendar_event(event) for event in events]
+
+    def calendar_event(self, event) -> CalendarEvent:
+        """All-day calendar event of a dinner, with the attendance as description."""
+        day = event.start_date.date()
+        cooks = []
+        eaters = 0
+        lines = {"Eating": [], "Not eating": [], "Unknown": []}
+        for attendance in event.attendees:
+            status = attendance.status
+            if status is not None and status.eating:
+                eaters += 1 + attendance.guests
+                if attendance.guests > 0:
+                    lines["Eating"].append(f"{attendance.name} + {attendance.guests}")
+                else:
+                    lines["Eating"].append(attendance.name)
+                if status is AttendanceStatus.COOK:
+                    cooks.append(attendance.name)
+            elif status is AttendanceStatus.NOT_ATTENDING:
+                lines["Not eating"].append(attendance.name)
+            else:
+                lines["Unknown"].append(attendance.name)
+
+        summary = f"Dinner by {', '.join(cooks)}" if cooks else "Dinner"
+        description = [event.description] if event.description else []
+        description.extend(
+            f"{label}: {', '.join(names)}" for label, names in lines.items() if names
+        )
+        # The group the entity was set up with, when the token no longer sees it
+        lijst = self.lijst_data
+        if lijst is not None:
+            group = lijst.group
+        else:
+            group = self.coordinator.groups[self._group_id]
+        location = ", ".join(part for part in (group.address, group.city) if part)
+        return CalendarEvent(
+            start=day,
+            end=day + timedelta(days=1),
+            summary=f"{summary} ({eaters} eating)",
+            description="\n".join(description) or None,
+            location=location or None,
+        )
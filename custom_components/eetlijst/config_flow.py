@@ -6,8 +6,14 @@ from typing import Any
 import voluptuous as vol
 from homeassistant import config_entries, exceptions, data_entry_flow
 from homeassistant.core import HomeAssistant, callback
-from .const import DOMAIN  # pylint:disable=unused-import
-from .lijst import test_token
+from homeassistant.util import dt as dt_util
+from .const import (  # pylint:disable=unused-import
+    DEFAULT_DEADLINE,
+    DEFAULT_HORIZON,
+    DOMAIN,
+    MAX_HORIZON,
+)
+from .lijst import test_token, token_expired
 
 
 _LOGGER = logging.getLogger(__name__)
@@ -24,6 +30,12 @@ OPTIONS_SCHEMA = vol.Schema(
         vol.Required("custom_pictures", default=False): bool,
         vol.Required("resident_units", default=False): bool,
         vol.Required("use_external_url", default=False): bool,
+        vol.Required("adaptive_polling", default=False): bool,
+        vol.Required("signup_deadline", default=DEFAULT_DEADLINE): str,
+        vol.Required("pause_when_away", default=False): bool,
+        vol.Required("future_days", default=DEFAULT_HORIZON): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=MAX_HORIZON)
+        ),
     }
 )
 
@@ -35,9 +47,11 @@ async def validate_input(hass: HomeAssistant, data: dict) -> dict[str, Any]:
     """
     if len(data["token"]) < 3:
         raise InvalidHost
+    if token_expired(data["token"]):
+        raise TokenExpired
 
     _LOGGER.debug("Validating eetlijst data")
-    (result, info) = await test_token(data["token"])
+    (result, info) = await test_token(hass, data["token"])
     if not result:
         if info is not None:
             if (
@@ -54,6 +68,12 @@ async def validate_input(hass: HomeAssistant, data: dict) -> dict[str, Any]:
     return {"title": info}
 
 
+def validate_deadline(data: dict) -> None:
+    """Check the sign-up deadline is a time of day, like 16:00."""
+    if dt_util.parse_time(data.get("signup_deadline", DEFAULT_DEADLINE)) is None:
+        raise InvalidDeadline
+
+
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Handle a config flow for Hello World."""
 
@@ -84,6 +104,8 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 errors["base"] = "cannot_connect"
             except InvalidToken:
                 errors["base"] = "invalid_token"
+            except TokenExpired:
+                errors["base"] = "token_expired"
             except Exception:  # pylint: disable=broad-except
                 _LOGGER.exception("Unexpected exception")
                 errors["base"] = "unknown"
@@ -96,12 +118,16 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     async def async_step_options(self, user_input=None, title=None):
         errors: dict[str, str] = {}
         if user_input is not None:
-            for input_key in user_input:
-                self.data[input_key] = user_input[input_key]
+            try:
+                validate_deadline(user_input)
+                for input_key in user_input:
+                    self.data[input_key] = user_input[input_key]
 
-            return self.async_create_entry(
-                title="Eetlijst {}".format(self.data["title"]), data=self.data
-            )
+                return self.async_create_entry(
+                    title="Eetlijst {}".format(self.data["title"]), data=self.data
+                )
+            except InvalidDeadline:
+                errors["signup_deadline"] = "invalid_deadline"
 
         return self.async_show_form(
             step_id="options", data_schema=OPTIONS_SCHEMA, errors=errors
@@ -134,6 +160,8 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 errors["base"] = "cannot_connect"
             except InvalidToken:
                 errors["base"] = "invalid_token"
+            except TokenExpired:
+                errors["base"] = "token_expired"
             except Exception:  # pylint: disable=broad-except
                 _LOGGER.exception("Unexpected exception")
                 errors["base"] = "unknown"
@@ -160,7 +188,7 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
             if opt in config_entry.data:
                 opt_set[opt] = config_entry.data[opt]
             else:
-                opt_set[opt] = False
+                opt_set[opt] = opt.default()
 
         self.options_schema = vol.Schema(
             {
@@ -172,6 +200,20 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                 vol.Required(
                     "use_external_url", default=opt_set["use_external_url"]
                 ): bool,
+                vol.Required(
+                    "adaptive_polling", default=opt_set["adaptive_polling"]
+                ): bool,
+                vol.Required(
+                    "signup_deadline", default=opt_set["signup_deadline"]
+                ): str,
+                vol.Required(
+                    "pause_when_away", default=opt_set["pause_when_away"]
+                ): bool,
+                vol.Required("future_days", default=opt_set["future_days"]): vol.All(
+                    vol.Coerce(int), vol.Range(min=1, max=MAX_HORIZON)
+                ),
+                # Replaces a token that still works but is about to expire
+                vol.Optional("update_jwt_token"): str,
             }
         )
 
@@ -182,8 +224,15 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
     ) -> data_entry_flow.FlowResult:
         """Manage the options."""
         self.new_data = {}
+        lijst = self.hass.data.get(DOMAIN, {}).get(self.config_entry.entry_id)
+        if lijst is not None and lijst.data is not None and lijst.last_update_success:
+            # The running coordinator just used the token without problems
+            _LOGGER.debug("Going to options step")
+            return await self.async_step_option_step()
         try:
-            (result, info) = await test_token(self.config_entry.data["token"])
+            (result, info) = await test_token(
+                self.hass, self.config_entry.data["token"]
+            )
             if not result:
                 if "errors" in info:
                     try:
@@ -230,6 +279,8 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                 errors["base"] = "cannot_connect"
             except InvalidToken:
                 errors["base"] = "invalid_token"
+            except TokenExpired:
+                errors["base"] = "token_expired"
             except Exception:  # pylint: disable=broad-except
                 _LOGGER.exception("Unexpected exception")
                 errors["base"] = "unknown"
@@ -245,8 +296,29 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
         errors = {}
         _LOGGER.debug("Showing options menu for eetlijst")
         if user_input is not None:
-            self.new_data.update(user_input)
-            return self.async_create_entry(title="", data=self.new_data)
+            user_input = dict(user_input)
+            token = user_input.pop("update_jwt_token", "").strip()
+            try:
+                validate_deadline(user_input)
+                if token:
+                    _LOGGER.debug("Got new Eetlijst JWT token")
+                    await validate_input(self.hass, {"token": token})
+                    self.new_data["token"] = token
+                self.new_data.update(user_input)
+                return self.async_create_entry(title="", data=self.new_data)
+            except InvalidDeadline:
+                errors["signup_deadline"] = "invalid_deadline"
+            except CannotConnect:
+                errors["base"] = "cannot_connect"
+            except InvalidHost:
+                errors["base"] = "cannot_connect"
+            except InvalidToken:
+                errors["base"] = "invalid_token"
+            except TokenExpired:
+                errors["base"] = "token_expired"
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Unexpected exception")
+                errors["base"] = "unknown"
 
         return self.async_show_form(
             step_id="option_step", data_schema=self.options_schema, errors=errors
@@ -265,5 +337,13 @@ class InvalidToken(exceptions.HomeAssistantError):
     """Error to indicate there is an invalid Token."""
 
 
+class TokenExpired(exceptions.HomeAssistantError):
+    """Error to indicate the Token has already expired."""
+
+
+class InvalidDeadline(exceptions.HomeAssistantError):
+    """Error to indicate the sign-up deadline is not a time of day."""
+
+
 class ResponseError(exceptions.HomeAssistantError):
     """Error to indicate that something went wrong in the token response."""
@@ -2,3 +2,74 @@
 
 DOMAIN = "eetlijst"
 REFRESH = 300
+
+# Snapshot cache of the last good data, so entities exist before the API answers
+STORAGE_VERSION = 1
+SNAPSHOT_SAVE_DELAY = 10
+
+# Seconds a successful token validation is reused by the flows and the setup
+VALIDATION_CACHE = 60
+
+# Seconds before the JWT token expires that a repair issue asks for a new one
+TOKEN_EXPIRY_WARNING = 3 * 24 * 3600
+
+# Seconds a response is shared with identical requests, see broker.py. A poll
+# only takes a response from within half its own interval, so this caps that
+# at half the normal interval
+REQUEST_FRESHNESS = REFRESH // 2
+
+# Retries of a single request on overload (429/5xx) and network errors, with an
+# exponential backoff from RETRY_BACKOFF up to RETRY_BACKOFF_MAX seconds. A
+# longer Retry-After is left to the circuit breaker instead of waited out.
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF = 1
+RETRY_BACKOFF_MAX = 30
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Seconds a single request may take in total before it counts as failed
+REQUEST_TIMEOUT = 20
+# Requests are stopped for CIRCUIT_COOLDOWN seconds after CIRCUIT_FAILURES
+# failed requests in a row, doubling while the API keeps failing
+CIRCUIT_FAILURES = 5
+CIRCUIT_COOLDOWN = 60
+CIRCUIT_COOLDOWN_MAX = 900
+# First poll after a failed refresh, doubling up to the normal interval
+RECOVERY_REFRESH = 10
+
+# Minimum age in seconds before a dataset is fetched again, today goes every tick
+DATASET_REFRESH = {
+    "info": 3600,
+    "today": 0,
+    "list": 600,
+    "future": 900,
+}
+# Tolerance so a dataset due right at a tick is not pushed to the next one
+DATASET_REFRESH_SLACK = 30
+SUBSCRIBED_REFRESH = 1800
+
+# Entity pictures go from -5 to 5 eaters
+ICON_MAX_EATERS = 5
+
+# Adaptive polling policy
+FAST_REFRESH = 60
+NIGHT_REFRESH = 3600
+# Poll fast during this many seconds before the sign-up deadline
+DEADLINE_WINDOW = 3600
+NIGHT_START = 0
+NIGHT_END = 7
+DEFAULT_DEADLINE = "16:00"
+
+# Days ahead the resident sensors show, fetched in pages of events
+DEFAULT_HORIZON = 7
+MAX_HORIZON = 60
+FUTURE_PAGE_SIZE = 14
+
+# Incremental sync of the future, see LijstCoordinator.sync_aliases. The full
+# future is fetched again every FULL_SYNC seconds to correct any drift, and
+# changes are requested SYNC_OVERLAP seconds before the watermark to cover
+# clock differences with the server
+FULL_SYNC = 3600
+SYNC_OVERLAP = 60
+
+# Seconds fetched calendar days from today on are reused, see cache.EventCache.
+# Past days are kept until a restart
+CALENDAR_CACHE_TTL = 3600
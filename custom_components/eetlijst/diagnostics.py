@@ -0,0 +1,40 @@
+"""Diagnostics support for Eetlijst."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .broker import CIRCUIT_BREAKER
+from .const import DOMAIN
+
+TO_REDACT = {"token", "lijst_dev_id", "update_jwt_token"}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    lijst = hass.data[DOMAIN][entry.entry_id]
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": async_redact_data(dict(entry.options), TO_REDACT),
+        },
+        "token": lijst.token_health(),
+        "coordinator": {
+            "last_update_success": lijst.last_update_success,
+            "update_interval": (
+                lijst.update_interval.total_seconds()
+                if lijst.update_interval is not None
+                else None
+            ),
+            "subscription_connected": lijst.subscription.connected,
+            "groups": len(lijst.groups),
+            "circuit_breaker_failures": CIRCUIT_BREAKER.failures,
+            "circuit_breaker_retry_in": round(CIRCUIT_BREAKER.retry_in),
+            "circuit_breaker_probing": CIRCUIT_BREAKER.probing,
+        },
+    }
@@ -6,17 +6,114 @@ from __future__ import annotations
 # See https://developers.home-assistant.io/docs/creating_integration_manifest
 # for more information.
 # This dummy hub always returns 3 rollers.
-import aiohttp
-from datetime import datetime, timedelta
+import asyncio
+import base64
+from dataclasses import replace
+from datetime import date, datetime, timedelta
+from functools import partial
+import json
 import logging
-from homeassistant.core import HomeAssistant
-from .const import DOMAIN, REFRESH
+
+import aiohttp
+
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.exceptions import ConfigEntryAuthFailed, HomeAssistantError
+from homeassistant.helpers import entity_registry as er, issue_registry as ir
+from homeassistant.helpers.event import (
+    async_track_point_in_utc_time,
+    async_track_state_change_event,
+    async_track_time_change,
+)
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+from .cache import EventCache, covered_until
+from .const import (
+    CALENDAR_CACHE_TTL,
+    DATASET_REFRESH,
+    DATASET_REFRESH_SLACK,
+    DEADLINE_WINDOW,
+    DEFAULT_DEADLINE,
+    DEFAULT_HORIZON,
+    DOMAIN,
+    FAST_REFRESH,
+    FULL_SYNC,
+    FUTURE_PAGE_SIZE,
+    ICON_MAX_EATERS,
+    MAX_HORIZON,
+    RECOVERY_REFRESH,
+    NIGHT_END,
+    NIGHT_REFRESH,
+    NIGHT_START,
+    REFRESH,
+    REQUEST_TIMEOUT,
+    RETRY_ATTEMPTS,
+    RETRY_BACKOFF_MAX,
+    RETRY_STATUSES,
+    SNAPSHOT_SAVE_DELAY,
+    STORAGE_VERSION,
+    SUBSCRIBED_REFRESH,
+    SYNC_OVERLAP,
+    TOKEN_EXPIRY_WARNING,
+    VALIDATION_CACHE,
+)
+from .model import (
+    AttendanceStatus,
+    Group,
+    LijstData,
+    ResidentStatus,
+    ShoppingItem,
+    apply_attendance,
+    apply_changes,
+    dataset_rows,
+    parse_dataset,
+)
+from .queries import (
+    AUTH_ERROR_CODES,
+    BALANCE,
+    DESCRIPTION,
+    PERSISTED_QUERIES,
+    ROOT_FIELDS,
+    SCHEMA_ERROR_CODES,
+    VALIDATE_QUERY,
+    Query,
+    day_start,
+    decode_response,
+    fingerprint,
+    mutation_query,
+    query_variables,
+    range_variables,
+    refresh_query,
+    response_keys,
+    split_alias,
+)
+from .broker import (
+    CIRCUIT_BREAKER,
+    REQUEST_BROKER,
+    ApiUnavailable,
+    backoff_delay,
+    retry_after_seconds,
+)
+from .subscription import LijstSubscription
 from homeassistant.helpers.update_coordinator import (
     DataUpdateCoordinator,
+    UpdateFailed,
 )
 
 APIURL = "https://api.samenn.nl/v1/graphql"
 SCAN_INTERVAL = timedelta(seconds=REFRESH)
+# Fallback poll while the subscription socket is delivering updates
+SUBSCRIBED_SCAN_INTERVAL = timedelta(seconds=SUBSCRIBED_REFRESH)
+FAST_SCAN_INTERVAL = timedelta(seconds=FAST_REFRESH)
+FULL_SYNC_INTERVAL = timedelta(seconds=FULL_SYNC)
+TOKEN_WARNING_PERIOD = timedelta(seconds=TOKEN_EXPIRY_WARNING)
+CALENDAR_CACHE_PERIOD = timedelta(seconds=CALENDAR_CACHE_TTL)
+NIGHT_SCAN_INTERVAL = timedelta(seconds=NIGHT_REFRESH)
+HOME_ZONE = "zone.home"
+
+# Token validations shared by the flows and the setup, see async_validate_token
+DATA_VALIDATION = f"{DOMAIN}_validation"
+VALIDATION_TTL = timedelta(seconds=VALIDATION_CACHE)
 
 LOGGER: logging.Logger = logging.getLogger(__package__)
 _LOGGER = logging.getLogger(__name__)
@@ -35,45 +132,216 @@ async def options_update_listener(hass: HomeAssistant, entry):
 
     setattr(lijst, "_config_options", current_conf)
     setattr(entry, "data", current_conf)
-    lijst.async_update_listeners()
+    if current_conf.get("token") != lijst._token:
+        # The headers, the subscription and the expiry all depend on the token
+        await hass.config_entries.async_reload(entry.entry_id)
+        return
+    lijst.update_interval = lijst.compute_update_interval(lijst.data)
+    # The options decide which fields and days are queried, so fetch them again
+    lijst.subscription.async_resubscribe()
+    await lijst.async_refresh_datasets("info", "future")
+    lijst.async_update_all_listeners()
 
 
-async def test_token(token) -> bool:
-    """Test connectivity to the API is OK."""
+async def async_validate_token(hass: HomeAssistant, token) -> tuple[bool, dict]:
+    """Check the token and fetch the group and roster in the same request.
+
+    Returns (True, group rows) or (False, error response). Valid results are
+    cached for a short while, so the config/options flows and the startup of
+    the entry share a single request.
+    """
+    cache = hass.data.setdefault(DATA_VALIDATION, {})
+    cached = cache.get(token)
+    if cached is not None and dt_util.utcnow() - cached[0] < VALIDATION_TTL:
+        return (True, cached[1])
+
     _LOGGER.debug("Testing Eetlijst connection")
     Headers = {}
     Headers["content-type"] = "application/json"
     Headers["Authorization"] = f"Bearer {token}"
-    body = """
-        query MyQuery {
-        eetschema_group {
-            city
-            address
-            active
-            default_status
-            name
-        }
-        }
-        """
-    async with aiohttp.ClientSession() as session:
-        async with session.post(
-            url=APIURL, headers=Headers, json={"query": body}
-        ) as resp:
-            respjson = await resp.json()
-            if resp.status == 200:
-                if "errors" in respjson:
-                    _LOGGER.error(f"Got an error in connecting to the API {respjson}")
-                    return (False, respjson)
-                else:
-                    try:
-                        eetlijst_info = respjson["data"]["eetschema_group"][0]
-                        lijst_name = eetlijst_info["name"]
-                        return (True, lijst_name)
-                    except Exception as exce:
-                        respjson["errors"] = exce
-                        return (False, respjson)
-            else:
-                return (False, None)
+    session = async_get_clientsession(hass)
+    try:
+        (status, respjson, _) = await async_post_query(session, Headers, VALIDATE_QUERY)
+    except ApiUnavailable as exce:
+        _LOGGER.error(f"Could not reach the Eetlijst API: {exce}")
+        return (False, None)
+    if status == 200:
+        if "errors" in respjson:
+            _LOGGER.error(f"Got an error in connecting to the API {respjson}")
+            return (False, respjson)
+        else:
+            try:
+                rows = respjson["data"]["info"]
+                rows[0]["name"]
+            except Exception as exce:
+                respjson["errors"] = exce
+                return (False, respjson)
+            remember_valid_token(hass, token, rows)
+            return (True, rows)
+    else:
+        return (False, None)
+
+
+async def async_post_query(
+    session,
+    headers,
+    query: Query,
+    variables=None,
+    known_fingerprint=None,
+    max_age=None,
+):
+    """Post a registered query and return the status, response and fingerprint.
+
+    Once the server has seen the document only its hash is sent. If the server
+    does not know the hash (anymore) the document is sent again in full.
+
+    Identical requests of other entries are merged by the request broker, which
+    may answer with a response of at most max_age seconds old. A successful
+    response whose raw body matches known_fingerprint is not decoded, the
+    response is returned as None. Raises ApiUnavailable when the API cannot
+    be reached, see _async_post.
+    """
+    variables = variables or {}
+    persisted = PERSISTED_QUERIES.use_hash(query)
+    while True:
+        payload = query.payload(variables, persisted)
+        key = (
+            headers.get("Authorization"),
+            query.sha256,
+            persisted,
+            json.dumps(payload["variables"], sort_keys=True),
+        )
+        (status, body) = await REQUEST_BROKER.async_request(
+            key, partial(_async_post, session, headers, payload), max_age
+        )
+        digest = fingerprint(body)
+        if status == 200 and digest == known_fingerprint:
+            return (status, None, digest)
+        try:
+            respjson = decode_response(body)
+        except ValueError as exce:
+            raise ApiUnavailable(
+                f"Invalid response from the Eetlijst API (status {status})"
+            ) from exce
+        if PERSISTED_QUERIES.handle_response(query, persisted, respjson):
+            persisted = False
+            continue
+        return (status, respjson, digest)
+
+
+async def async_post_mutation(session, headers, query: Query, variables):
+    """Post a mutation and return the status and response.
+
+    Mutations bypass the request broker, so they are never merged with another
+    request or answered from a recent response. They are sent only once, as a
+    retried insert could be applied twice.
+    """
+    (status, body) = await _async_post(
+        session, headers, query.payload(variables), attempts=1
+    )
+    try:
+        return (status, decode_response(body))
+    except ValueError as exce:
+        raise ApiUnavailable(
+            f"Invalid response from the Eetlijst API (status {status})"
+        ) from exce
+
+
+async def _async_post(
+    session, headers, payload, attempts: int = RETRY_ATTEMPTS
+) -> tuple[int, bytes]:
+    """Post to the API, retrying overload and network errors with a backoff.
+
+    A Retry-After longer than the backoff is not waited out here, it keeps the
+    circuit breaker open instead so no entry polls before it has passed.
+    """
+    attempt = 0
+    while True:
+        CIRCUIT_BREAKER.check()
+        retry_after = None
+        try:
+            async with session.post(
+                url=APIURL,
+                headers=headers,
+                json=payload,
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+            ) as resp:
+                body = await resp.read()
+                if resp.status not in RETRY_STATUSES:
+                    CIRCUIT_BREAKER.record_success()
+                    return (resp.status, body)
+                retry_after = retry_after_seconds(resp.headers.get("Retry-After"))
+                error = f"status {resp.status}"
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exce:
+            error = repr(exce)
+
+        attempt += 1
+        if (
+            attempt >= attempts
+            # The probe of a half-open circuit is not retried, see CircuitBreaker
+            or CIRCUIT_BREAKER.probing
+            or (retry_after or 0) > RETRY_BACKOFF_MAX
+        ):
+            CIRCUIT_BREAKER.record_failure(retry_after)
+            raise ApiUnavailable(
+                f"Eetlijst API unavailable: {error}",
+                max(retry_after or 0, CIRCUIT_BREAKER.retry_in),
+            )
+        delay = backoff_delay(attempt) if retry_after is None else retry_after
+        _LOGGER.debug(f"Eetlijst API returned {error}, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+@callback
+def remember_valid_token(hass: HomeAssistant, token, rows) -> None:
+    """Mark the token as valid, with the group rows it returned."""
+    hass.data.setdefault(DATA_VALIDATION, {})[token] = (dt_util.utcnow(), rows)
+
+
+def token_expires_at(token) -> datetime | None:
+    """Expiry of a JWT token from its exp claim, None when it cannot be read."""
+    try:
+        payload = token.split(".")[1]
+        padding = "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload + padding))
+        return dt_util.utc_from_timestamp(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError, OverflowError):
+        return None
+
+
+def token_expired(token) -> bool:
+    """Whether the exp claim of a JWT token has passed."""
+    expires_at = token_expires_at(token)
+    return expires_at is not None and expires_at <= dt_util.utcnow()
+
+
+async def test_token(hass: HomeAssistant, token) -> bool:
+    """Test connectivity to the API is OK."""
+    (valid, result) = await async_validate_token(hass, token)
+    if valid:
+        return (True, ", ".join(group["name"] for group in result))
+    return (False, result)
+
+
+def snapshot_store(hass: HomeAssistant, entry_id) -> Store:
+    """Store holding the snapshot cache of a config entry."""
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}")
+
+
+def is_auth_error(respjson) -> bool:
+    """Whether the API rejected the request because of the JWT token."""
+    for error in respjson.get("errors", []):
+        if error.get("extensions", {}).get("code") in AUTH_ERROR_CODES:
+            return True
+    return False
+
+
+def is_schema_error(respjson) -> bool:
+    """Whether the API rejected the document, e.g. a field it does not have."""
+    for error in respjson.get("errors", []):
+        if error.get("extensions", {}).get("code") in SCHEMA_ERROR_CODES:
+            return True
+    return False
 
 
 class LijstCoordinator(DataUpdateCoordinator):
@@ -101,6 +369,10 @@ class LijstCoordinator(DataUpdateCoordinator):
         self._callbacks = set()
         # self.firmware_version = f"0.0.{random.randint(1, 9)}"
         self.model = "Eetlijst"
+        self.groups = {}
+        self.rosters = {}
+        # Sensor index per resident of each group, the suffix of its unique id
+        self.resident_sensors = {}
         self.is_setup = False
         self.last_idx = 0
         self._config_options = config_data
@@ -108,222 +380,1087 @@ class LijstCoordinator(DataUpdateCoordinator):
         Headers["content-type"] = "application/json"
         Headers["Authorization"] = f"Bearer {self._token}"
         self.api_headers = Headers
+        # Shared, keep-alive session owned by Home Assistant; must not be closed here
+        self._session = async_get_clientsession(hass)
+        self.subscription = LijstSubscription(self)
+        # Last parsed response and fetch time per dataset, see DATASET_REFRESH.
+        # The info dataset holds every group, the others are kept per group id
+        self._datasets = {}
+        self._fetched_at = {}
+        self._forced_datasets = set()
+        self._pages_task = None
+        # Local date the data view was last derived on, see format_resident_dict
+        self._merged_day = None
+        # Events per group for the calendar, see async_get_events
+        self.event_caches = {}
+        # Incremental sync of the future, see sync_aliases
+        self._incremental_sync = True
+        self._sync_watermark = None
+        self._full_sync_at = None
+        # Failed refreshes in a row, see retry_interval
+        self._failures = 0
+        # Token health, see async_setup_token_expiry and token_health
+        self.token_expires_at = token_expires_at(self._token)
+        self.last_auth_failure = None
+        # Raw body fingerprints of the last polled response per query document
+        # and of the last pushed message per dataset
+        self._poll_fingerprints = {}
+        self._push_fingerprints = {}
+        # Data and slices per listener context as of the last notification
+        self._notified_data = None
+        self._notified_success = None
+        self._notified_slices = None
+        self._store = snapshot_store(hass, self.entry_id)
 
     async def _async_update_data(self) -> None:
-        queries = {}
-        data = {}
-        queries["info"] = self.query_body_info()
-        queries["today"] = self.query_body_today()
-        queries["list"] = self.query_body_list()
-        queries["future"] = self.query_body_future()
-
-        async with aiohttp.ClientSession() as session:
-            for query_type in queries:
-                body = queries[query_type]
-                async with session.post(
-                    url=APIURL, headers=self.api_headers, json={"query": body}
-                ) as resp:
-                    respjson = await resp.json()
-                    if resp.status != 200:
-                        _LOGGER.error("Error Connecting to the Eetlijst API")
-                        break
-                    data[query_type] = respjson["data"]
-        data["future"] = self.format_future_dict(data["future"])
+        if self.token_expired():
+            # No point in sending requests that are rejected anyway
+            self.record_auth_failure("The JWT token has expired")
+            raise ConfigEntryAuthFailed("Eetlijst JWT token has expired")
+
+        features = self.enabled_features()
+        aliases = self.due_datasets(self.needed_datasets(features))
+        if not aliases:
+            return self.merge_datasets()
+
+        fields = self.query_fields(features)
+        groups = self.query_groups()
+        while True:
+            query_aliases = self.sync_aliases(aliases)
+            query = refresh_query(query_aliases, fields, groups)
+            started = dt_util.utcnow()
+            try:
+                (status, respjson, digest) = await async_post_query(
+                    self._session,
+                    self.api_headers,
+                    query,
+                    query_variables(
+                        self.horizon, since=self._sync_watermark, today=self.today()
+                    ),
+                    self._poll_fingerprints.get(query.sha256),
+                    # A forced refresh must not get another entry's result
+                    0 if self._forced_datasets else self.shared_response_age(),
+                )
+            except ApiUnavailable as exce:
+                self.update_interval = self.retry_interval(exce.retry_after)
+                raise UpdateFailed(str(exce)) from exce
+            if (
+                "changes" in query_aliases
+                and respjson is not None
+                and is_schema_error(respjson)
+            ):
+                _LOGGER.warning(
+                    "The Eetlijst API does not support incremental sync, "
+                    f"fetching the full future instead: {respjson['errors']}"
+                )
+                self._incremental_sync = False
+                continue
+            break
+
+        now = dt_util.utcnow()
+        if respjson is None:
+            # Byte for byte the previous response, nothing to parse or notify
+            changed = []
+        else:
+            if is_auth_error(respjson):
+                self.record_auth_failure(respjson["errors"][0].get("message"))
+                raise ConfigEntryAuthFailed("Eetlijst JWT token is no longer valid")
+            if status != 200 or "errors" in respjson or "data" not in respjson:
+                _LOGGER.error(f"Error Connecting to the Eetlijst API: {respjson}")
+                self.update_interval = self.retry_interval()
+                raise UpdateFailed(f"Eetlijst API returned status {status}")
+            fetched = [alias for alias in query_aliases if alias != "changes"]
+            changed = self.store_datasets(
+                fetched, respjson["data"], groups, keep_tail=True
+            )
+            if "changes" in query_aliases and self.merge_changes(
+                respjson["data"], groups
+            ):
+                changed.append("future")
+            self._poll_fingerprints[query.sha256] = digest
+            for alias in changed:
+                self.forget_pushes(alias)
+            if "info" in aliases:
+                remember_valid_token(self.hass, self._token, respjson["data"]["info"])
+            if "info" in changed and self.groups and set(self.group_ids) != set(
+                self.groups
+            ):
+                _LOGGER.warning(
+                    "The groups of the Eetlijst token changed, reloading component"
+                )
+                self.hass.async_create_task(
+                    self.hass.config_entries.async_reload(self.entry_id)
+                )
+        self._failures = 0
+        if "future" in query_aliases:
+            # Rows changed during the request are fetched again next time
+            self._sync_watermark = started - timedelta(seconds=SYNC_OVERLAP)
+            self._full_sync_at = now
+        for alias in aliases:
+            self._fetched_at[alias] = now
+        self._forced_datasets.difference_update(aliases)
+        if "changes" in query_aliases and self._sync_watermark is None:
+            # A change refers to an event that is not known yet
+            self._forced_datasets.add("future")
+            self.hass.async_create_task(self.async_request_refresh())
+
+        if changed or self.data is None or self._merged_day != self.today():
+            # The resident states depend on the date, even when no dataset changed
+            data = self.merge_datasets()
+            self._store.async_delay_save(self._snapshot_rows, SNAPSHOT_SAVE_DELAY)
+        else:
+            data = self.data
+        self.update_interval = self.compute_update_interval(data)
+        if "future" in query_aliases:
+            self.start_future_pages(fields)
         return data
 
-    async def setuplijst(self) -> None:
-        body = """
-            query MyQuery {
-            eetschema_group {
-                city
-                address
-                active
-                default_status
-                name
-                users_in_groups(where: {active: {_eq: true}}) {
-                order
-                user {
-                    name
-                    id
-                }
-                }
-            }
-            }
+    def token_expired(self) -> bool:
+        """Whether the exp claim of the token has passed."""
+        return (
+            self.token_expires_at is not None
+            and self.token_expires_at <= dt_util.utcnow()
+        )
+
+    @callback
+    def record_auth_failure(self, error) -> None:
+        self.last_auth_failure = (dt_util.utcnow(), error)
+
+    def token_health(self) -> dict:
+        """Expiry and last failure of the token, for the diagnostics."""
+        expires_at = self.token_expires_at
+        failure = self.last_auth_failure
+        return {
+            "expires_at": expires_at.isoformat() if expires_at else None,
+            "seconds_to_expiry": (
+                round((expires_at - dt_util.utcnow()).total_seconds())
+                if expires_at
+                else None
+            ),
+            "expired": self.token_expired(),
+            "last_auth_failure": (
+                {"at": failure[0].isoformat(), "error": failure[1]}
+                if failure
+                else None
+            ),
+        }
+
+    @callback
+    def async_setup_token_expiry(self) -> CALLBACK_TYPE:
+        """Warn ahead of the token expiry and stop polling once it has expired.
+
+        A repair issue is raised TOKEN_EXPIRY_WARNING seconds before the exp
+        claim, at the expiry itself a refresh fails with an auth error, which
+        starts the reauth flow and stops the polling. Returns the unsubscribe.
         """
+        issue_id = f"token_expiring_{self.entry_id}"
+        expires_at = self.token_expires_at
+        if expires_at is None:
+            ir.async_delete_issue(self.hass, DOMAIN, issue_id)
+            return lambda: None
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                url=APIURL, headers=self.api_headers, json={"query": body}
-            ) as resp:
-                respjson = await resp.json()
-
-                if not "data" in respjson:
-                    _LOGGER.error(f"No data key in eetlijst response: {respjson}")
-
-                _LOGGER.info(f"Eetlijst got response {respjson}")
-                eetlijst_info = respjson["data"]["eetschema_group"][0]
-                self.lijst_name = eetlijst_info["name"]
-                self._name = "Eetlijst {}".format(eetlijst_info["name"])
-                self.lijst_info = eetlijst_info
-                residents = []
-                residents_order = {}
-                for user in eetlijst_info["users_in_groups"]:
-                    person = user["user"]["name"]
-                    residents.append(person)
-                    # person_num = user["order"]
-                    # if person_num in residents_order:
-                    #     while person_num in residents_order:
-                    #         person_num += 1
-                    # residents_order[person_num] = {
-                    #     "name": person,
-                    #     "id": user["user"]["id"],
-                    # }
-                    residents_order[user["user"]["id"]] = person
-
-                self.residents = residents
-                self._residents_ordered = residents_order
-                self.model = self.lijst_name
-
-    async def test_connection(self) -> bool:
-        """Test connectivity to the Dummy hub is OK."""
-        body = """
-            query MyQuery {
-            eetschema_group {
-                city
-                address
-                active
-                default_status
-                name
-            }
-            }
-            """
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                url=APIURL, headers=self.api_headers, json={"query": body}
-            ) as resp:
-                respjson = await resp.json()
-                if resp.status == 200:
-                    if "errors" in respjson:
-                        print("Got an error in connecting to the API")
-                        return False
-                    else:
-                        lijstinfo = respjson["data"]["eetschema_group"][0]
-                        self._name = "Eetlijst {}".format(lijstinfo["name"])
-                        # self.name = self._name
-                        self._id = "{}_{}".format(
-                            self._token.lower(), lijstinfo["name"]
-                        )
-                        for callback in self._callbacks:
-                            callback()
-                        return True
-
-    def query_body_info(self) -> str:
-        return """
-                query MyQuery {
-                    eetschema_group {
-                        city
-                        address
-                        active
-                        default_status
-                        name
-                        summary(order_by: {}) {
-                            payed_total
-                            user_id
-                            }
-                        users_in_groups(where: {active: {_eq: true}}) {
-                        order
-                        user {
-                            name
-                            id
-                        }
-                        }
-                    }
+        @callback
+        def _async_warn(now=None) -> None:
+            ir.async_create_issue(
+                self.hass,
+                DOMAIN,
+                issue_id,
+                is_fixable=False,
+                severity=ir.IssueSeverity.WARNING,
+                translation_key="token_expiring",
+                translation_placeholders={
+                    "name": self._name or "Eetlijst",
+                    "expires": dt_util.as_local(expires_at).strftime("%Y-%m-%d %H:%M"),
+                },
+            )
+
+        @callback
+        def _async_expired(now=None) -> None:
+            _LOGGER.warning("The Eetlijst JWT token has expired, pausing polling")
+            self.subscription.async_stop()
+            self.update_interval = None
+            self.hass.async_create_task(self.async_refresh())
+
+        now = dt_util.utcnow()
+        unsubs = []
+        if expires_at - TOKEN_WARNING_PERIOD <= now:
+            _async_warn()
+        else:
+            ir.async_delete_issue(self.hass, DOMAIN, issue_id)
+            unsubs.append(
+                async_track_point_in_utc_time(
+                    self.hass, _async_warn, expires_at - TOKEN_WARNING_PERIOD
+                )
+            )
+        if expires_at > now:
+            unsubs.append(
+                async_track_point_in_utc_time(self.hass, _async_expired, expires_at)
+            )
+
+        @callback
+        def _async_unsubscribe() -> None:
+            for unsub in unsubs:
+                unsub()
+
+        return _async_unsubscribe
+
+    def retry_interval(self, retry_after: float = 0) -> timedelta:
+        """Poll again soon after a failed refresh, backing off while it fails."""
+        self._failures += 1
+        delay = min(RECOVERY_REFRESH * 2 ** (self._failures - 1), REFRESH)
+        return timedelta(seconds=max(delay, retry_after))
+
+    def shared_response_age(self) -> float | None:
+        """Oldest response of another entry a poll takes, in seconds.
+
+        Half the current interval, so the data is never staler than the
+        polling cadence allows. Capped by the broker at REQUEST_FRESHNESS.
+        """
+        if self.update_interval is None:
+            return None
+        return self.update_interval.total_seconds() / 2
+
+    @property
+    def group_ids(self) -> tuple:
+        """Ids of the groups the token sees, in the order of the API."""
+        return tuple(group.id for group in self._datasets.get("info", ()))
+
+    def query_groups(self) -> tuple:
+        """Groups to split the datasets on, none when the token sees one group.
+
+        A single group keeps the unfiltered documents, several groups are
+        fetched together with every dataset selected once per group.
+        """
+        group_ids = self.group_ids
+        return group_ids if len(group_ids) > 1 else ()
+
+    def dataset_groups(self, alias, groups) -> list[tuple[str, object]]:
+        """Keys of a dataset in a response with the group id they belong to."""
+        group_ids = groups or self.group_ids[:1]
+        return [
+            (key, group_ids[idx or 0]) for key, idx in response_keys(alias, groups)
+        ]
+
+    @callback
+    def forget_pushes(self, alias) -> None:
+        """Drop the fingerprints of pushed messages of a dataset that changed."""
+        for key in list(self._push_fingerprints):
+            if split_alias(key)[0] == alias:
+                del self._push_fingerprints[key]
+
+    def sync_aliases(self, aliases) -> list[str]:
+        """The datasets to query, with the future replaced by its changes.
+
+        After a full fetch of the future only the attendance rows changed since
+        then are requested, until the next full sync is due: every FULL_SYNC
+        seconds, on a new day, or when a change refers to an unknown event.
+        """
+        if (
+            "future" not in aliases
+            or not self._incremental_sync
+            or self._sync_watermark is None
+            or "future" not in self._datasets
+            or "future" in self._forced_datasets
+            or dt_util.utcnow() - self._full_sync_at >= FULL_SYNC_INTERVAL
+            or dt_util.as_local(self._full_sync_at).date() != self.today()
+        ):
+            return list(aliases)
+        return ["changes" if alias == "future" else alias for alias in aliases]
+
+    def merge_changes(self, response: dict, groups) -> bool:
+        """Merge changed attendance rows into the future, returns if it changed."""
+        stored = self._datasets["future"]
+        changed = False
+        full_sync = False
+        for key, group_id in self.dataset_groups("changes", groups):
+            rows = response[key]
+            if rows:
+                self._sync_watermark = max(
+                    self._sync_watermark,
+                    max(datetime.fromisoformat(row["updated_at"]) for row in rows),
+                )
+            events = apply_changes(stored.get(group_id, ()), rows)
+            if events is None:
+                full_sync = True
+            elif events != stored.get(group_id, ()):
+                stored[group_id] = events
+                changed = True
+        if full_sync:
+            _LOGGER.debug("Eetlijst changes refer to a new event, doing a full sync")
+            self._sync_watermark = None
+        return changed
+
+    def today(self) -> date:
+        """The current date in the time zone of Home Assistant."""
+        return dt_util.now().date()
+
+    @property
+    def horizon(self) -> int:
+        """Number of days ahead the future dataset covers."""
+        days = int(self._config_options.get("future_days", DEFAULT_HORIZON))
+        return max(1, min(MAX_HORIZON, days))
+
+    def store_datasets(
+        self, aliases, response: dict, groups=(), keep_tail=False
+    ) -> list[str]:
+        """Parse the datasets of a response, returns the ones that changed.
+
+        Unchanged datasets keep their previously parsed object, so the derived
+        data and the sensors' slices compare equal by identity. With keep_tail
+        a full first page of the future keeps the later events fetched before,
+        until the next pages replace them.
+        """
+        changed = []
+        for alias in aliases:
+            if alias == "info":
+                value = parse_dataset(alias, response[alias])
+                if self._datasets.get(alias) != value:
+                    self._datasets[alias] = value
+                    changed.append(alias)
+                continue
+
+            stored = self._datasets.setdefault(alias, {})
+            dataset_changed = False
+            for key, group_id in self.dataset_groups(alias, groups):
+                value = parse_dataset(alias, response[key])
+                if keep_tail and alias == "future" and len(value) == FUTURE_PAGE_SIZE:
+                    value = value + self.future_tail(group_id, value[-1].start_date)
+                if group_id not in stored or stored[group_id] != value:
+                    stored[group_id] = value
+                    dataset_changed = True
+            if dataset_changed:
+                changed.append(alias)
+        return changed
+
+    def future_tail(self, group_id, after) -> tuple:
+        """The stored future events of a group after the given start date."""
+        return tuple(
+            event
+            for event in self._datasets.get("future", {}).get(group_id, ())
+            if event.start_date > after
+        )
+
+    @callback
+    def start_future_pages(self, fields) -> None:
+        """Fetch the rest of the horizon in the background."""
+        group_ids = [
+            group_id
+            for group_id, events in self._datasets["future"].items()
+            if len(events) >= FUTURE_PAGE_SIZE
+        ]
+        if not group_ids:
+            return
+        if self._pages_task is not None and not self._pages_task.done():
+            self._pages_task.cancel()
+        self._pages_task = self.hass.async_create_background_task(
+            self._async_fetch_future_pages(fields, group_ids),
+            f"Eetlijst future pages {self.entry_id}",
+        )
+
+    @callback
+    def async_cancel_future_pages(self) -> None:
+        """Stop fetching the future pages, when the entry is unloaded."""
+        if self._pages_task is not None and not self._pages_task.done():
+            self._pages_task.cancel()
+        self._pages_task = None
+
+    async def _async_fetch_future_pages(self, fields, group_ids) -> None:
+        """Fetch the future page by page after the first one.
+
+        Every page is folded into the data as soon as it arrives, so the
+        sensors fill up day by day instead of waiting for the whole horizon.
+        """
+        for group_id in group_ids:
+            groups = (group_id,) if self.query_groups() else ()
+            query = refresh_query(["future"], fields, groups)
+            key = response_keys("future", groups)[0][0]
+            stored = self._datasets["future"]
+            events = stored[group_id][:FUTURE_PAGE_SIZE]
+            while True:
+                try:
+                    (status, respjson, _) = await async_post_query(
+                        self._session,
+                        self.api_headers,
+                        query,
+                        query_variables(
+                            self.horizon, offset=len(events), today=self.today()
+                        ),
+                    )
+                except ApiUnavailable as exce:
+                    _LOGGER.debug(f"Could not fetch the Eetlijst future: {exce}")
+                    return
+                if (
+                    status != 200
+                    or respjson.get("errors")
+                    or respjson.get("data") is None
+                ):
+                    _LOGGER.debug(f"Could not fetch the Eetlijst future: {respjson}")
+                    return
+                page = parse_dataset("future", respjson["data"][key])
+                events += page
+                if len(page) == FUTURE_PAGE_SIZE:
+                    value = events + self.future_tail(group_id, events[-1].start_date)
+                else:
+                    value = events
+                if value != stored.get(group_id):
+                    stored[group_id] = value
+                    self.forget_pushes("future")
+                    self.async_set_updated_data(self.merge_datasets())
+                    self._store.async_delay_save(
+                        self._snapshot_rows, SNAPSHOT_SAVE_DELAY
+                    )
+                if len(page) < FUTURE_PAGE_SIZE:
+                    break
+
+    async def async_load_snapshot(self) -> bool:
+        """Restore the data of the last good refresh from the snapshot cache.
+
+        The restored datasets are not marked as fetched, so the next refresh
+        fetches all of them again.
+        """
+        snapshot = await self._store.async_load()
+        if not snapshot:
+            return False
+        try:
+            for alias, rows in snapshot["datasets"].items():
+                if alias == "info":
+                    self._datasets[alias] = parse_dataset(alias, rows)
+                else:
+                    self._datasets[alias] = {
+                        entry["group"]: parse_dataset(alias, entry["rows"])
+                        for entry in rows
                     }
-                """
-
-    def query_body_today(self) -> str:
-        today_str = datetime.today().date().strftime("%Y-%m-%d")
-        today_filt = f"{today_str}T00:00:00+00:00"
-
-        body = (
-            """
-        query MyQuery {
-        eetschema_event(where: {start_date: {_eq: \"%s\"}}) {
-            start_date
-            end_date
-            name
-            type
-            open
-            description
-            event_attendees_all_users(where: {active: {_eq: true}}, order_by: {order: asc}) {
-            status
-            order
-            number_guests
-            user {
-                name
-                id
-            }
+            self.resident_sensors = {
+                entry["group"]: dict(entry["sensors"])
+                for entry in snapshot.get("residents", [])
             }
-        }
-        }
+            self.data = self.merge_datasets()
+        except (KeyError, TypeError, ValueError) as exce:
+            _LOGGER.warning(f"Ignoring invalid Eetlijst snapshot cache: {exce}")
+            self._datasets = {}
+            self.resident_sensors = {}
+            self.data = None
+            return False
+        self.setup_groups(self._datasets["info"])
+        return True
+
+    @callback
+    def _snapshot_rows(self) -> dict:
+        datasets = {}
+        group_ids = self.group_ids
+        for alias, value in self._datasets.items():
+            if alias == "info":
+                datasets[alias] = dataset_rows(alias, value)
+                continue
+            datasets[alias] = [
+                {"group": group_id, "rows": dataset_rows(alias, group_value)}
+                for group_id, group_value in value.items()
+                if group_id in group_ids
+            ]
+        residents = [
+            {"group": group_id, "sensors": sensors}
+            for group_id, sensors in self.resident_sensors.items()
+        ]
+        return {"datasets": datasets, "residents": residents}
+
+    def enabled_features(self) -> set[str]:
+        """Which sensor types are enabled in the entity registry.
+
+        Before the entities are registered everything counts as enabled.
         """
-            % today_filt
+        registry = er.async_get(self.hass)
+        entries = er.async_entries_for_config_entry(registry, self.entry_id)
+        if not entries:
+            return {"info", "today", "list", "resident"}
+
+        features = set()
+        for entry in entries:
+            if entry.disabled_by is not None:
+                continue
+            if entry.unique_id.endswith("_shopping_list"):
+                features.add("list")
+            elif entry.unique_id.endswith("_shopping_todo"):
+                features.add("list")
+            elif entry.unique_id.endswith("_calendar"):
+                features.add("calendar")
+            elif entry.unique_id.endswith("_info"):
+                features.add("info")
+            elif entry.unique_id.endswith("_today"):
+                features.add("today")
+            else:
+                features.add("resident")
+        return features
+
+    def needed_datasets(self, features) -> list[str]:
+        """The datasets the enabled sensors and options need."""
+        needed = ["info"]
+        if (
+            features & {"today", "resident", "calendar"}
+            or self._config_options.get("adaptive_polling", False)
+        ):
+            needed.append("today")
+        if "list" in features:
+            needed.append("list")
+        if features & {"resident", "calendar"}:
+            needed.append("future")
+        return needed
+
+    def query_fields(self, features) -> set[str]:
+        """The optional fields the enabled sensors and options need."""
+        fields = set()
+        if "resident" in features and self._config_options.get("show_balance"):
+            fields.add(BALANCE)
+        if features & {"today", "calendar"}:
+            fields.add(DESCRIPTION)
+        return fields
+
+    def due_datasets(self, needed=DATASET_REFRESH) -> list[str]:
+        """Return the needed datasets whose refresh cadence has passed."""
+        now = dt_util.utcnow()
+        due = []
+        for alias in needed:
+            cadence = DATASET_REFRESH[alias]
+            fetched_at = self._fetched_at.get(alias)
+            if (
+                fetched_at is None
+                or alias in self._forced_datasets
+                or (now - fetched_at).total_seconds()
+                >= cadence - DATASET_REFRESH_SLACK
+            ):
+                due.append(alias)
+        return due
+
+    async def async_refresh_datasets(self, *aliases) -> None:
+        """Refresh the given datasets now, regardless of their cadence."""
+        self._forced_datasets.update(aliases or DATASET_REFRESH)
+        await self.async_refresh()
+
+    async def async_set_attendance(
+        self, group_id, user_ids, dates, status=None, guests=None
+    ) -> None:
+        """Set the status and/or guests of residents for one or more days."""
+        dates = set(dates)
+        user_ids = set(user_ids)
+        if status is not None:
+            status = AttendanceStatus(status)
+        updates = {}
+        if group_id in self._datasets.get("today", {}):
+            today = self._datasets["today"][group_id]
+            if today is not None:
+                (today,) = apply_attendance((today,), dates, user_ids, status, guests)
+            updates["today"] = today
+        if group_id in self._datasets.get("future", {}):
+            updates["future"] = apply_attendance(
+                self._datasets["future"][group_id], dates, user_ids, status, guests
+            )
+        attendance = {}
+        if status is not None:
+            attendance["status"] = status.value
+        if guests is not None:
+            attendance["number_guests"] = guests
+        await self._async_mutate(
+            "attendance",
+            group_id,
+            {
+                "dates": [day_start(day) for day in sorted(dates)],
+                "users": sorted(user_ids),
+                "attendance": attendance,
+            },
+            updates,
         )
-        return body
-
-    def query_body_future(self):
-        today_str = datetime.today().date().strftime("%Y-%m-%d")
-        today_filt = f"{today_str}T00:00:00+00:00"
-        body = (
-            """
-            query MyQuery($_gt: timestamptz = "") {
-            eetschema_event(
-                order_by: {start_date: asc}
-                where: {start_date: {_gte:  \"%s\"}}
-                limit: 7
-            ) {
-                start_date
-                event_attendees_all_users(where: {active: {_eq: true}}, order_by: {order: asc}) {
-                user {
-                    name
-                    id
-                }
-                status
-                order
-                number_guests
-                }
-            }
-            }
-            """
-            % today_filt
+
+    async def async_add_shopping_items(self, group_id, texts) -> None:
+        """Add items to the shopping list."""
+        shopping = self._datasets.get("list", {}).get(group_id, ())
+        await self._async_mutate(
+            "add_items",
+            group_id,
+            {"items": [{"group_id": group_id, "text": text} for text in texts]},
+            {"list": shopping + tuple(ShoppingItem(text) for text in texts)},
+        )
+
+    async def async_check_shopping_items(self, group_id, texts) -> None:
+        """Check items off the shopping list."""
+        shopping = self._datasets.get("list", {}).get(group_id, ())
+        await self._async_mutate(
+            "check_items",
+            group_id,
+            {"texts": list(texts)},
+            {"list": tuple(item for item in shopping if item.text not in texts)},
         )
-        return body
-
-    def format_future_dict(self, response):
-        persons_dict = {}
-        for idx, eet_event in enumerate(response["eetschema_event"]):
-            date = eet_event["start_date"]
-            dtobj = datetime.fromisoformat(date)
-            daystr = datetime.strftime(dtobj, "%A")
-            if idx == 0:
+
+    async def async_update_shopping_items(self, group_id, ids, **changes) -> None:
+        """Change the text of, check off or remove (active=False) items by id.
+
+        Only unchecked, active items are on the list, the others are dropped.
+        """
+        ids = set(ids)
+        shopping = []
+        for item in self._datasets.get("list", {}).get(group_id, ()):
+            if item.id in ids:
+                if changes.get("checked") or changes.get("active") is False:
+                    continue
+                if "text" in changes:
+                    item = replace(item, text=changes["text"])
+            shopping.append(item)
+        await self._async_mutate(
+            "update_items",
+            group_id,
+            {"ids": list(ids), "changes": changes},
+            {"list": tuple(shopping)},
+        )
+
+    async def _async_mutate(self, alias, group_id, variables, updates) -> None:
+        """Send a mutation for a group, applying its result to the data up front.
+
+        The updated datasets are shown right away and confirmed by a single
+        refresh of just those datasets afterwards. When the mutation fails or
+        changes nothing, the previous datasets are restored.
+        """
+        # Datasets the group had before, a dataset it did not have is removed
+        previous = {}
+        for dataset, value in updates.items():
+            stored = self._datasets.setdefault(dataset, {})
+            if group_id in stored:
+                previous[dataset] = stored[group_id]
+            stored[group_id] = value
+        self.apply_local_update(updates)
+
+        query = mutation_query(alias, group_id)
+        key = response_keys(alias, (group_id,))[0][0]
+        try:
+            (status, respjson) = await async_post_mutation(
+                self._session, self.api_headers, query, variables
+            )
+        except ApiUnavailable as exce:
+            error = str(exce)
+        else:
+            if status != 200 or "errors" in respjson:
+                error = f"status {status}: {respjson.get('errors')}"
+            elif not respjson["data"][key]["affected_rows"]:
+                error = "nothing matched"
+            else:
+                error = None
+        if error is not None:
+            for dataset in updates:
+                if dataset in previous:
+                    self._datasets[dataset][group_id] = previous[dataset]
+                else:
+                    del self._datasets[dataset][group_id]
+            self.apply_local_update(updates)
+            raise HomeAssistantError(f"Eetlijst {alias} failed: {error}")
+
+        self.hass.async_create_task(self.async_refresh_datasets(*updates))
+
+    @callback
+    def apply_local_update(self, datasets) -> None:
+        """Show datasets changed locally, rather than fetched, to the sensors."""
+        # The next responses must be parsed again, even when they are unchanged
+        self._poll_fingerprints.clear()
+        for alias in datasets:
+            self.forget_pushes(alias)
+        self.async_set_updated_data(self.merge_datasets())
+
+    def merge_datasets(self) -> dict[str, LijstData]:
+        """Build the data view per group the sensors read from the datasets."""
+        # Datasets of disabled sensors are never fetched
+        self._merged_day = self.today()
+        data = {}
+        for group in self._datasets["info"]:
+            today = self._datasets.get("today", {}).get(group.id)
+            if today is not None and today.start_date.date() != self._merged_day:
+                # Fetched before midnight, today's event is not known yet
+                today = None
+            future = self._datasets.get("future", {}).get(group.id, ())
+            if group.id in self._datasets.get("future", {}):
+                self.cache_future(group.id, today, future)
+            data[group.id] = LijstData(
+                group=group,
+                today=today,
+                future=future,
+                shopping=self._datasets.get("list", {}).get(group.id, ()),
+                residents=self.format_resident_dict(future, today, group),
+            )
+        return data
+
+    def event_cache(self, group_id) -> EventCache:
+        """The calendar event cache of a group."""
+        if group_id not in self.event_caches:
+            self.event_caches[group_id] = EventCache(CALENDAR_CACHE_PERIOD)
+        return self.event_caches[group_id]
+
+    def cache_future(self, group_id, today, future) -> None:
+        """Put the fetched future in the event cache, as the calendar's fresh part."""
+        today_date = self.today()
+        events = {event.start_date.date(): event for event in future}
+        if today is not None and today.start_date.date() == today_date:
+            # Today is fetched with its description and more often
+            events[today_date] = today
+        self.event_cache(group_id).store(
+            today_date,
+            covered_until(today_date, self.horizon, future, FUTURE_PAGE_SIZE),
+            events.values(),
+            dt_util.utcnow(),
+        )
+
+    async def async_get_events(self, group_id, start: date, end: date) -> list:
+        """The events of a group from start up to end, for the calendar.
+
+        Only the days the event cache does not hold (anymore) are fetched. When
+        the API cannot be reached the cached events are returned.
+        """
+        cache = self.event_cache(group_id)
+        groups = (group_id,) if self.query_groups() else ()
+        query = refresh_query(["events"], (), groups)
+        key = response_keys("events", groups)[0][0]
+        for (gap_start, gap_end) in cache.missing(
+            start, end, dt_util.utcnow(), self.today()
+        ):
+            try:
+                (status, respjson, _) = await async_post_query(
+                    self._session,
+                    self.api_headers,
+                    query,
+                    range_variables(gap_start, gap_end),
+                )
+            except ApiUnavailable as exce:
+                _LOGGER.debug(f"Could not fetch the Eetlijst calendar: {exce}")
+                break
+            if (
+                status != 200
+                or respjson.get("errors")
+                or respjson.get("data") is None
+            ):
+                _LOGGER.debug(f"Could not fetch the Eetlijst calendar: {respjson}")
+                break
+            cache.store(
+                gap_start,
+                gap_end,
+                parse_dataset("events", respjson["data"][key]),
+                dt_util.utcnow(),
+            )
+        return cache.events(start, end)
+
+    def listener_slices(self, data: dict[str, LijstData]) -> dict:
+        """Split the data into the slices the sensors subscribe to by context."""
+        slices = {}
+        for group_id, lijst in data.items():
+            slices[(group_id, "info")] = lijst.group
+            slices[(group_id, "today")] = lijst.today
+            slices[(group_id, "list")] = lijst.shopping
+            for user_id, resident in lijst.residents.items():
+                slices[(group_id, "resident", user_id)] = resident
+        return slices
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Only notify the listeners whose slice of the data changed.
+
+        Listeners without a context, or with one that is not in the data, are
+        always notified. After a failed update everybody is notified, so the
+        availability is updated.
+        """
+        if (
+            self.data is not None
+            and self.data is self._notified_data
+            and self.last_update_success is self._notified_success
+        ):
+            # The refresh returned the data the listeners already have
+            return
+        self._notified_data = self.data
+        self._notified_success = self.last_update_success
+
+        previous = self._notified_slices
+        if self.data is None or not self.last_update_success:
+            slices = None
+        else:
+            slices = self.listener_slices(self.data)
+        self._notified_slices = slices
+
+        for update_callback, context in list(self._listeners.values()):
+            if (
+                slices is None
+                or previous is None
+                or context not in slices
+                or slices[context] != previous.get(context)
+            ):
+                update_callback()
+
+    @callback
+    def async_update_all_listeners(self) -> None:
+        """Notify every listener, e.g. after the options changed."""
+        self._notified_data = None
+        self._notified_slices = None
+        self.async_update_listeners()
+
+    def is_known_push(self, digest) -> bool:
+        """Whether a pushed message is the last one applied for its dataset."""
+        return digest in self._push_fingerprints.values()
+
+    @callback
+    def async_set_subscription_data(self, key, payload, digest=None) -> None:
+        """Merge a dataset pushed over the subscription into the current data.
+
+        The key is the subscription id, the dataset alias with the group
+        prefix of response_keys when the token sees several groups.
+        """
+        if self.data is None:
+            return
+        (alias, idx) = split_alias(key)
+        groups = self.query_groups()
+        if idx is not None and idx >= len(groups):
+            return
+        group = groups[idx : idx + 1] if idx is not None else ()
+        self._fetched_at[alias] = dt_util.utcnow()
+        self._push_fingerprints[key] = digest
+        # Stored as a response of the single group, under that group's key
+        (group_key, _) = response_keys(alias, group)[0]
+        if not self.store_datasets(
+            [alias], {group_key: payload[ROOT_FIELDS[alias]]}, group
+        ):
+            return
+        # The polled responses containing this dataset are outdated now
+        self._poll_fingerprints.clear()
+        self.async_set_updated_data(self.merge_datasets())
+        self._store.async_delay_save(self._snapshot_rows, SNAPSHOT_SAVE_DELAY)
+
+    @callback
+    def async_subscription_state(self, connected: bool) -> None:
+        """Poll slowly while pushed updates arrive, fall back to polling otherwise."""
+        _LOGGER.debug(f"Eetlijst subscription connected: {connected}")
+        self.update_interval = self.compute_update_interval(self.data)
+
+    @callback
+    def async_setup_scheduler(self) -> CALLBACK_TYPE:
+        """Resume polling when somebody comes home, returns the unsubscribe."""
+        return async_track_state_change_event(
+            self.hass, [HOME_ZONE], self._async_home_changed
+        )
+
+    @callback
+    def _async_home_changed(self, event: Event) -> None:
+        was_paused = self.update_interval is None
+        self.update_interval = self.compute_update_interval(self.data)
+        if was_paused and self.update_interval is not None:
+            _LOGGER.debug("Somebody came home, resuming Eetlijst polling")
+            self.hass.async_create_task(self.async_request_refresh())
+
+    @callback
+    def async_setup_day_rollover(self) -> CALLBACK_TYPE:
+        """Refresh the date bound datasets at local midnight, returns unsubscribe."""
+        return async_track_time_change(
+            self.hass, self._async_day_changed, hour=0, minute=0, second=0
+        )
+
+    @callback
+    def _async_day_changed(self, now=None) -> None:
+        if self.token_expired():
+            return
+        _LOGGER.debug("New day, refreshing the Eetlijst today and future")
+        self.subscription.async_resubscribe()
+        if self.data is not None:
+            # Roll over right away, yesterday's events are left out until the
+            # refresh, even when it fails or polling is paused
+            self.async_set_updated_data(self.merge_datasets())
+        if self.update_interval is None:
+            # Paused while nobody is home, fetched when polling resumes
+            self._forced_datasets.update(("today", "future"))
+            return
+        self.hass.async_create_task(self.async_refresh_datasets("today", "future"))
+
+    def compute_update_interval(self, data) -> timedelta | None:
+        """Pick the polling interval from the adaptive policy.
+
+        Returns None to pause polling while nobody is home, or for good once
+        the token has expired.
+        """
+        if self.token_expired():
+            return None
+        if self.subscription.connected:
+            base = SUBSCRIBED_SCAN_INTERVAL
+        else:
+            base = SCAN_INTERVAL
+        if not self._config_options.get("adaptive_polling", False):
+            return base
+
+        if self._config_options.get("pause_when_away", False):
+            home = self.hass.states.get(HOME_ZONE)
+            if home is not None and home.state == "0":
+                return None
+
+        now = dt_util.now()
+        if NIGHT_START <= now.hour < NIGHT_END:
+            return max(base, NIGHT_SCAN_INTERVAL)
+
+        if data is None or not any(
+            lijst.today is not None and lijst.today.open for lijst in data.values()
+        ):
+            return base
+
+        deadline_str = self._config_options.get("signup_deadline", DEFAULT_DEADLINE)
+        deadline_time = dt_util.parse_time(deadline_str)
+        if deadline_time is None:
+            deadline_time = dt_util.parse_time(DEFAULT_DEADLINE)
+        deadline = now.replace(
+            hour=deadline_time.hour,
+            minute=deadline_time.minute,
+            second=0,
+            microsecond=0,
+        )
+        if 0 <= (deadline - now).total_seconds() <= DEADLINE_WINDOW:
+            # Pushed updates are already live, only speed up a plain poll
+            return base if self.subscription.connected else FAST_SCAN_INTERVAL
+        return base
+
+    async def setuplijst(self) -> None:
+        """Set up the roster from the (usually cached) token validation.
+
+        The group info is kept as the info dataset, so the first refresh does
+        not fetch it a second time.
+        """
+        (valid, result) = await async_validate_token(self.hass, self._token)
+        if not valid:
+            _LOGGER.error(f"Error setting up the eetlijst: {result}")
+            raise ConfigEntryAuthFailed("Eetlijst JWT token is no longer valid")
+
+        self._datasets["info"] = parse_dataset("info", result)
+        self._fetched_at["info"] = dt_util.utcnow()
+        self.setup_groups(self._datasets["info"])
+
+    def setup_groups(self, groups: tuple[Group, ...]) -> None:
+        """Set the lists and rosters the devices and entities are created from.
+
+        The group the entry was created for is the primary one, it keeps the
+        device and entity ids from before a token could serve several groups.
+        """
+        primary = groups[0]
+        for group in groups:
+            if group.name == self._config_options.get("title"):
+                primary = group
+                break
+        self.primary_group = primary.id
+        self.lijst_name = primary.name
+        self._name = "Eetlijst {}".format(primary.name)
+        self.model = self.lijst_name
+
+        self.groups = {}
+        self.rosters = {}
+        self.resident_sensors = {
+            group.id: self.resident_sensors.get(group.id, {}) for group in groups
+        }
+        for group in groups:
+            self.groups[group.id] = group
+            self.update_roster(group)
+
+    def update_roster(self, group: Group) -> tuple[dict, list[int]]:
+        """Bring the roster of a group in line with its info.
+
+        Residents keep their sensor index, so their entity keeps its unique id,
+        and residents who joined get the next index. Returns the added residents
+        with their index and the indices of the residents who left.
+        """
+        roster = {resident.id: resident.name for resident in group.residents}
+        sensors = self.resident_sensors.setdefault(group.id, {})
+        removed = [
+            sensors.pop(user_id) for user_id in list(sensors) if user_id not in roster
+        ]
+        next_idx = max([*sensors.values(), *removed], default=-1) + 1
+        added = {}
+        for user_id in roster:
+            if user_id not in sensors:
+                sensors[user_id] = added[user_id] = next_idx
+                next_idx += 1
+        self.rosters[group.id] = roster
+        if (added or removed) and self.data is not None:
+            self._store.async_delay_save(self._snapshot_rows, SNAPSHOT_SAVE_DELAY)
+        return (added, removed)
+
+    def device_id(self, group_id) -> str:
+        """Id of the device of a group, the prefix of its entities' unique ids."""
+        if group_id == self.primary_group:
+            return self._id
+        return f"{self._id}_{group_id}"
+
+    def format_resident_dict(self, future, today, group) -> dict:
+        """Derive every resident's sensor state in one pass over the events.
+
+        The event of the current local date is labelled Today, the others in the
+        coming week by weekday and later ones by date, so a long horizon has
+        unique keys. Events of past days are left out until the future is
+        refreshed. Today is fetched more often than the future, so its attendance
+        takes precedence.
+        """
+        today_date = self.today()
+        days = {}
+        for event in future:
+            event_date = event.start_date.date()
+            if event_date < today_date:
+                continue
+            if event_date == today_date:
                 daystr = "Today"
+            elif (event_date - today_date).days < 7:
+                daystr = event.start_date.strftime("%A")
+            else:
+                daystr = event_date.isoformat()
+            days[daystr] = event
+        if today is not None and today.start_date.date() == today_date:
+            days["Today"] = today
 
-            for person in eet_event["event_attendees_all_users"]:
-                if not person["user"]["id"] in persons_dict:
-                    persons_dict[person["user"]["id"]] = person["user"]
-                    persons_dict[person["user"]["id"]]["next_week"] = {}
-                persons_dict[person["user"]["id"]]["next_week"][daystr] = {
-                    "status": person["status"],
-                    "number_guests": person["number_guests"],
-                }
-        return persons_dict
-
-    def query_body_list(self) -> str:
-        return """
-            query MyQuery {
-            eetschema_list(where: {checked: {_eq: false}, active: {_eq: true}}) {
-                text
-                checked
-            }
-            }
-            """
+        per_user = {}
+        for daystr, event in days.items():
+            for attendance in event.attendees:
+                per_user.setdefault(attendance.user_id, {})[daystr] = attendance
+
+        residents = {}
+        for user_id, attendances in per_user.items():
+            residents[user_id] = self._resident_status(
+                attendances, group.balances.get(user_id)
+            )
+        return residents
+
+    def _resident_status(self, attendances, balance) -> ResidentStatus:
+        state = None
+        eetstatus_num = None
+        guests = 0
+        day_texts = []
+        today_status = None
+        for daystr, attendance in attendances.items():
+            status = attendance.status
+            if status is None or status is AttendanceStatus.DONT_KNOW_YET:
+                day_text = "not_set"
+            else:
+                day_text = status.value
+            eating = status is not None and status.eating
+
+            if daystr == "Today":
+                today_status = status
+                state = day_text
+                if eating:
+                    guests = attendance.guests
+                    if status is AttendanceStatus.COOK:
+                        eetstatus_num = 1 + guests
+                    else:
+                        eetstatus_num = -1 - guests
+                elif status is AttendanceStatus.NOT_ATTENDING:
+                    eetstatus_num = 0
+            else:
+                if eating and attendance.guests > 0:
+                    day_text = f"{day_text} + {attendance.guests}"
+                day_texts.append((daystr, day_text))
+
+        icon = "none"
+        if eetstatus_num is not None:
+            eetnum = max(-ICON_MAX_EATERS, min(ICON_MAX_EATERS, eetstatus_num))
+            if today_status is AttendanceStatus.GOT_GROCERIES:
+                icon = f"shop_{eetnum}"
+            else:
+                icon = str(eetnum)
+
+        return ResidentStatus(
+            state=state,
+            eetstatus_num=eetstatus_num,
+            guests=guests,
+            days=tuple(day_texts),
+            icon=icon,
+            balance=balance,
+        )
@@ -0,0 +1,292 @@
+"""Typed model of the Eetlijst data.
+
+The coordinator parses every API response into these objects once, after which
+they are shared read-only by all sensors. The raw GraphQL dicts are never
+mutated or kept around; to_api turns an object back into the rows it was parsed
+from, which is what the snapshot cache stores.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from enum import Enum
+
+
+class AttendanceStatus(str, Enum):
+    """Attendance status of a resident for an event."""
+
+    COOK = "cook"
+    EAT_ONLY = "eat_only"
+    GOT_GROCERIES = "got_groceries"
+    NOT_ATTENDING = "not_attending"
+    DONT_KNOW_YET = "dont_know_yet"
+
+    @property
+    def eating(self) -> bool:
+        """Whether the resident is eating along."""
+        return self in (
+            AttendanceStatus.COOK,
+            AttendanceStatus.EAT_ONLY,
+            AttendanceStatus.GOT_GROCERIES,
+        )
+
+    @classmethod
+    def parse(cls, value) -> AttendanceStatus | None:
+        """Return the status, or None when it is not set or not known."""
+        try:
+            return cls(value)
+        except ValueError:
+            return None
+
+
+@dataclass(frozen=True, slots=True)
+class Resident:
+    """A member of the group."""
+
+    id: str
+    name: str
+    order: int | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class Group:
+    """The Eetlijst group, its roster and the balance per resident in cents."""
+
+    id: str | int
+    name: str
+    city: str | None
+    address: str | None
+    active: bool | None
+    residents: tuple[Resident, ...]
+    balances: dict[str, int] = field(default_factory=dict)
+
+    @classmethod
+    def from_api(cls, group: dict) -> Group:
+        residents = tuple(
+            Resident(
+                id=user["user"]["id"],
+                name=user["user"]["name"],
+                order=user.get("order"),
+            )
+            for user in group.get("users_in_groups", [])
+        )
+        balances = {
+            entry["user_id"]: entry["payed_total"] for entry in group.get("summary", [])
+        }
+        return cls(
+            id=group["id"],
+            name=group["name"],
+            city=group.get("city"),
+            address=group.get("address"),
+            active=group.get("active"),
+            residents=residents,
+            balances=balances,
+        )
+
+    def to_api(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "city": self.city,
+            "address": self.address,
+            "active": self.active,
+            "users_in_groups": [
+                {
+                    "order": resident.order,
+                    "user": {"id": resident.id, "name": resident.name},
+                }
+                for resident in self.residents
+            ],
+            "summary": [
+                {"user_id": user_id, "payed_total": payed_total}
+                for user_id, payed_total in self.balances.items()
+            ],
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class Attendance:
+    """A resident's attendance for a single event."""
+
+    user_id: str
+    name: str
+    status: AttendanceStatus | None
+    guests: int = 0
+
+    @classmethod
+    def from_api(cls, attendee: dict) -> Attendance:
+        guests = attendee.get("number_guests")
+        if not isinstance(guests, int) or guests < 0:
+            guests = 0
+        return cls(
+            user_id=attendee["user"]["id"],
+            name=attendee["user"]["name"],
+            status=AttendanceStatus.parse(attendee.get("status")),
+            guests=guests,
+        )
+
+    def to_api(self) -> dict:
+        return {
+            "user": {"id": self.user_id, "name": self.name},
+            "status": self.status.value if self.status is not None else None,
+            "number_guests": self.guests,
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class Event:
+    """A dinner event and its attendees, in the order of the list."""
+
+    start_date: datetime
+    attendees: tuple[Attendance, ...]
+    open: bool | None = None
+    description: str | None = None
+
+    @classmethod
+    def from_api(cls, event: dict) -> Event:
+        return cls(
+            start_date=datetime.fromisoformat(event["start_date"]),
+            attendees=tuple(
+                Attendance.from_api(attendee)
+                for attendee in event["event_attendees_all_users"]
+            ),
+            open=event.get("open"),
+            description=event.get("description"),
+        )
+
+    def to_api(self) -> dict:
+        return {
+            "start_date": self.start_date.isoformat(),
+            "open": self.open,
+            "description": self.description,
+            "event_attendees_all_users": [
+                attendance.to_api() for attendance in self.attendees
+            ],
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class ShoppingItem:
+    """An item on the shopping list, id is None until the API returned it."""
+
+    text: str
+    checked: bool = False
+    id: str | int | None = None
+
+    @classmethod
+    def from_api(cls, item: dict) -> ShoppingItem:
+        return cls(
+            text=item["text"], checked=bool(item.get("checked")), id=item.get("id")
+        )
+
+    def to_api(self) -> dict:
+        return {"id": self.id, "text": self.text, "checked": self.checked}
+
+
+@dataclass(frozen=True, slots=True)
+class ResidentStatus:
+    """Derived sensor state of a resident, computed once per refresh."""
+
+    state: str | None
+    eetstatus_num: int | None
+    guests: int
+    days: tuple[tuple[str, str], ...]
+    icon: str
+    balance: int | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class LijstData:
+    """Everything the sensors of one group read, as shared by the coordinator."""
+
+    group: Group
+    today: Event | None
+    future: tuple[Event, ...]
+    shopping: tuple[ShoppingItem, ...]
+    residents: dict[str, ResidentStatus]
+
+
+def parse_dataset(alias: str, rows: list):
+    """Parse the rows of one dataset of the refresh query into the model."""
+    if alias == "info":
+        return tuple(Group.from_api(group) for group in rows)
+    if alias == "today":
+        return Event.from_api(rows[0]) if rows else None
+    if alias in ("future", "events"):
+        return tuple(Event.from_api(event) for event in rows)
+    if alias == "list":
+        return tuple(ShoppingItem.from_api(item) for item in rows)
+    raise ValueError(f"Unknown Eetlijst dataset {alias}")
+
+
+def apply_changes(events: tuple[Event, ...], rows: list) -> tuple[Event, ...] | None:
+    """Merge changed attendance rows into the events, keyed by event and user.
+
+    Events without changes keep their object. Returns None when a row belongs
+    to an event that is not known yet, the future then has to be fetched in full.
+    """
+    table = {}
+    for event in events:
+        table[event.start_date] = {
+            attendance.user_id: attendance for attendance in event.attendees
+        }
+    touched = set()
+    for row in rows:
+        start_date = datetime.fromisoformat(row["event"]["start_date"])
+        attendees = table.get(start_date)
+        if attendees is None:
+            return None
+        if row.get("active", True):
+            attendees[row["user"]["id"]] = Attendance.from_api(row)
+        else:
+            attendees.pop(row["user"]["id"], None)
+        touched.add(start_date)
+
+    return tuple(
+        replace(event, attendees=tuple(table[event.start_date].values()))
+        if event.start_date in touched
+        else event
+        for event in events
+    )
+
+
+def apply_attendance(
+    events: tuple[Event, ...],
+    dates,
+    user_ids,
+    status: AttendanceStatus | None = None,
+    guests: int | None = None,
+) -> tuple[Event, ...]:
+    """Set the status and/or guests of the users on the events of the dates.
+
+    Like the attendance mutation only existing attendances are updated. Events
+    without changes keep their object.
+    """
+    changes = {}
+    if status is not None:
+        changes["status"] = status
+    if guests is not None:
+        changes["guests"] = guests
+    return tuple(
+        replace(
+            event,
+            attendees=tuple(
+                replace(attendance, **changes)
+                if attendance.user_id in user_ids
+                else attendance
+                for attendance in event.attendees
+            ),
+        )
+        if event.start_date.date() in dates
+        else event
+        for event in events
+    )
+
+
+def dataset_rows(alias: str, value) -> list:
+    """Turn a parsed dataset back into API rows, the inverse of parse_dataset."""
+    if value is None:
+        return []
+    if alias == "today":
+        return [value.to_api()]
+    return [row.to_api() for row in value]
@@ -0,0 +1,481 @@
+"""Registry of the GraphQL documents sent to the Eetlijst API.
+
+Every document is built once and reused, with the dates passed as GraphQL
+variables, so the text sent to the server is the same on every request. That
+also allows Automatic Persisted Queries: after a document has been sent once,
+only its sha256 hash is sent.
+
+Responses are fingerprinted on their raw body, so an unchanged response can be
+recognised before it is decoded.
+
+This module has no Home Assistant dependencies, so the query layer can be
+benchmarked on its own.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+import hashlib
+import json
+
+from .const import DEFAULT_HORIZON, FUTURE_PAGE_SIZE
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+INFO_SELECTION = """
+    eetschema_group {
+        id
+        city
+        address
+        active
+        default_status
+        name
+        summary(order_by: {}) { payed_total user_id }  # if balance
+        users_in_groups(where: {active: {_eq: true}}) {
+            order
+            user {
+                name
+                id
+            }
+        }
+    }
+"""
+
+TODAY_SELECTION = """
+    eetschema_event(where: {start_date: {_eq: $today}}) {
+        start_date
+        open
+        description  # if description
+        event_attendees_all_users(where: {active: {_eq: true}}, order_by: {order: asc}) {
+            status
+            number_guests
+            user {
+                name
+                id
+            }
+        }
+    }
+"""
+
+FUTURE_SELECTION = """
+    eetschema_event(
+        order_by: {start_date: asc}
+        where: {start_date: {_gte: $today, _lt: $until}}
+        limit: $limit
+        offset: $offset
+    ) {
+        start_date
+        open
+        description  # if description
+        event_attendees_all_users(where: {active: {_eq: true}}, order_by: {order: asc}) {
+            user {
+                name
+                id
+            }
+            status
+            number_guests
+        }
+    }
+"""
+
+# Events of a date range of the calendar, see cache.EventCache
+EVENTS_SELECTION = """
+    eetschema_event(
+        order_by: {start_date: asc}
+        where: {start_date: {_gte: $start, _lt: $end}}
+    ) {
+        start_date
+        open
+        description
+        event_attendees_all_users(where: {active: {_eq: true}}, order_by: {order: asc}) {
+            user {
+                name
+                id
+            }
+            status
+            number_guests
+        }
+    }
+"""
+
+# Attendance rows of the future changed since the sync watermark
+CHANGES_SELECTION = """
+    eetschema_event_attendee(
+        where: {
+            updated_at: {_gt: $since}
+            event: {start_date: {_gte: $today, _lt: $until}}
+        }
+        order_by: {updated_at: asc}
+    ) {
+        updated_at
+        active
+        status
+        number_guests
+        event {
+            start_date
+        }
+        user {
+            name
+            id
+        }
+    }
+"""
+
+LIST_SELECTION = """
+    eetschema_list(where: {checked: {_eq: false}, active: {_eq: true}}) {
+        id
+        text
+        checked
+    }
+"""
+
+# Mutations of the write services, always sent for a single group
+ATTENDANCE_MUTATION = """
+    update_eetschema_event_attendee(
+        where: {
+            event: {start_date: {_in: $dates}}
+            user: {id: {_in: $users}}
+        }
+        _set: $attendance
+    ) { affected_rows }
+"""
+
+ADD_ITEMS_MUTATION = """
+    insert_eetschema_list(objects: $items) { affected_rows }
+"""
+
+CHECK_ITEMS_MUTATION = """
+    update_eetschema_list(
+        where: {text: {_in: $texts}, checked: {_eq: false}, active: {_eq: true}}
+        _set: {checked: true}
+    ) { affected_rows }
+"""
+
+# Changes to items of the shopping list by id, for the todo entity
+UPDATE_ITEMS_MUTATION = """
+    update_eetschema_list(where: {id: {_in: $ids}}, _set: $changes) {
+        affected_rows
+    }
+"""
+
+SELECTIONS = {
+    "info": INFO_SELECTION,
+    "today": TODAY_SELECTION,
+    "list": LIST_SELECTION,
+    "future": FUTURE_SELECTION,
+    "changes": CHANGES_SELECTION,
+    "events": EVENTS_SELECTION,
+    "attendance": ATTENDANCE_MUTATION,
+    "add_items": ADD_ITEMS_MUTATION,
+    "check_items": CHECK_ITEMS_MUTATION,
+    "update_items": UPDATE_ITEMS_MUTATION,
+}
+
+# Root field each dataset selects, its alias in the response is the dataset name
+ROOT_FIELDS = {
+    "info": "eetschema_group",
+    "today": "eetschema_event",
+    "list": "eetschema_list",
+    "future": "eetschema_event",
+    "changes": "eetschema_event_attendee",
+    "events": "eetschema_event",
+    "attendance": "update_eetschema_event_attendee",
+    "add_items": "insert_eetschema_list",
+    "check_items": "update_eetschema_list",
+    "update_items": "update_eetschema_list",
+}
+
+# Filter selecting the rows of one group, for tokens that see several groups
+GROUP_FILTERS = {
+    "today": "group_id: {{_eq: {}}}",
+    "future": "group_id: {{_eq: {}}}",
+    "list": "group_id: {{_eq: {}}}",
+    "changes": "_and: {{event: {{group_id: {{_eq: {}}}}}}}",
+    "events": "group_id: {{_eq: {}}}",
+    "attendance": "_and: {{event: {{group_id: {{_eq: {}}}}}}}",
+    "check_items": "group_id: {{_eq: {}}}",
+    "update_items": "group_id: {{_eq: {}}}",
+}
+
+# Optional fields, a selection line ending in "# if <field>" is only sent when
+# that field is requested
+BALANCE = "balance"
+DESCRIPTION = "description"
+ALL_FIELDS = frozenset((BALANCE, DESCRIPTION))
+
+# GraphQL variables used by each dataset and their types
+VARIABLES = {
+    "today": {"today": "timestamptz!"},
+    "future": {
+        "today": "timestamptz!",
+        "until": "timestamptz!",
+        "limit": "Int!",
+        "offset": "Int!",
+    },
+    "changes": {
+        "since": "timestamptz!",
+        "today": "timestamptz!",
+        "until": "timestamptz!",
+    },
+    "events": {"start": "timestamptz!", "end": "timestamptz!"},
+    "attendance": {
+        "dates": "[timestamptz!]!",
+        "users": "[uuid!]!",
+        "attendance": "eetschema_event_attendee_set_input!",
+    },
+    "add_items": {"items": "[eetschema_list_insert_input!]!"},
+    "check_items": {"texts": "[String!]!"},
+    "update_items": {"ids": "[uuid!]!", "changes": "eetschema_list_set_input!"},
+}
+
+# Error codes of the API that mean the JWT token has to be replaced
+AUTH_ERROR_CODES = ("invalid-jwt", "invalid-headers")
+
+# Error codes meaning the document does not match the schema of the API
+SCHEMA_ERROR_CODES = ("validation-failed",)
+
+# Error codes meaning the server does not know the hash (yet)
+PERSISTED_QUERY_NOT_FOUND = ("PERSISTED_QUERY_NOT_FOUND", "PersistedQueryNotFound")
+
+# Error codes meaning the server does not support persisted queries. Hasura
+# does not know them and fails to parse a request without a document.
+PERSISTED_QUERY_NOT_SUPPORTED = (
+    "PERSISTED_QUERY_NOT_SUPPORTED",
+    "PersistedQueryNotSupported",
+    "parse-failed",
+)
+
+
+@dataclass(frozen=True)
+class Query:
+    """A compiled GraphQL document."""
+
+    name: str
+    document: str
+    sha256: str
+    variables: tuple[str, ...]
+
+    def payload(self, variables: dict, persisted: bool = False) -> dict:
+        """Request body, with only the hash when the document is persisted."""
+        body = {
+            "operationName": self.name,
+            "variables": {key: variables[key] for key in self.variables},
+            "extensions": {
+                "persistedQuery": {"version": 1, "sha256Hash": self.sha256}
+            },
+        }
+        if not persisted:
+            body["query"] = self.document
+        return body
+
+
+def prune_selection(selection: str, fields: frozenset) -> str:
+    """Drop the optional lines of a selection whose field is not requested."""
+    lines = []
+    for line in selection.strip().splitlines():
+        if "# if " in line:
+            line, field = line.split("# if ")
+            if field.strip() not in fields:
+                continue
+            line = line.rstrip()
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def filter_group(alias: str, selection: str, group_id) -> str:
+    """Restrict the selection of a dataset to a single group."""
+    condition = GROUP_FILTERS[alias].format(json.dumps(group_id))
+    return selection.replace("where: {", f"where: {{{condition}, ", 1)
+
+
+def group_alias(alias: str, idx: int) -> str:
+    """Alias of a dataset of the idx-th group in a multi-group document."""
+    return f"g{idx}_{alias}"
+
+
+def split_alias(key: str) -> tuple[str, int | None]:
+    """The dataset and group index of a response key, see group_alias."""
+    prefix, _, alias = key.partition("_")
+    if alias in GROUP_FILTERS and prefix[:1] == "g" and prefix[1:].isdigit():
+        return (alias, int(prefix[1:]))
+    return (key, None)
+
+
+def response_keys(alias: str, groups: tuple = ()) -> list[tuple[str, int | None]]:
+    """Keys of a dataset in the response with the index of their group."""
+    if not groups or alias not in GROUP_FILTERS:
+        return [(alias, None)]
+    return [(group_alias(alias, idx), idx) for idx in range(len(groups))]
+
+
+@lru_cache(maxsize=None)
+def build_query(
+    name: str,
+    aliases: tuple[str, ...],
+    operation: str = "query",
+    fields: frozenset = ALL_FIELDS,
+    groups: tuple = (),
+) -> Query:
+    """Compile the datasets into one document, each under its own alias.
+
+    With groups, every dataset except the group info is selected once per
+    group, see response_keys. A single dataset in a subscription is not
+    aliased, so its result has the same layout as the plain query. Mutations
+    are built the same way, with operation "mutation".
+    """
+    declared = {}
+    for alias in aliases:
+        declared.update(VARIABLES.get(alias, {}))
+    definitions = ", ".join(f"${key}: {kind}" for key, kind in declared.items())
+    if definitions:
+        definitions = f"({definitions})"
+
+    entries = []
+    for alias in aliases:
+        selection = prune_selection(SELECTIONS[alias], fields)
+        for key, idx in response_keys(alias, groups):
+            if idx is None:
+                entries.append((key, selection))
+            else:
+                entries.append((key, filter_group(alias, selection, groups[idx])))
+    if operation == "subscription" and len(entries) == 1:
+        selections = entries[0][1]
+    else:
+        selections = "\n".join(f"{key}: {selection}" for key, selection in entries)
+    document = f"{operation} {name}{definitions} {{\n{selections}\n}}"
+    return Query(
+        name=name,
+        document=document,
+        sha256=hashlib.sha256(document.encode()).hexdigest(),
+        variables=tuple(declared),
+    )
+
+
+def refresh_query(aliases, fields=ALL_FIELDS, groups=()) -> Query:
+    """The combined refresh query for the given datasets and optional fields."""
+    return build_query(
+        "EetlijstRefresh", tuple(aliases), "query", frozenset(fields), tuple(groups)
+    )
+
+
+def subscription_query(alias: str, fields=ALL_FIELDS, groups=()) -> Query:
+    """The subscription document of a single dataset (of a single group)."""
+    return build_query(
+        f"Eetlijst_{alias}",
+        (alias,),
+        "subscription",
+        frozenset(fields),
+        tuple(groups),
+    )
+
+
+def mutation_query(alias: str, group_id) -> Query:
+    """The mutation document of a write service for a single group."""
+    groups = (group_id,) if alias in GROUP_FILTERS else ()
+    return build_query(f"Eetlijst_{alias}", (alias,), "mutation", ALL_FIELDS, groups)
+
+
+def day_start(day: date) -> str:
+    """The start_date of the events of a day, midnight UTC of that date."""
+    return f"{day.isoformat()}T00:00:00+00:00"
+
+
+def query_variables(
+    horizon: int = DEFAULT_HORIZON,
+    offset: int = 0,
+    limit: int = FUTURE_PAGE_SIZE,
+    since: datetime | None = None,
+    today: date | None = None,
+) -> dict:
+    """Values of the GraphQL variables used by the registered queries.
+
+    The future dataset covers horizon days from today, limit events at a time
+    starting at offset. The changes dataset returns the rows changed after since.
+    Events start at midnight UTC of their date, so today is the local date of
+    the caller, sent as that instant; the system date is only the fallback.
+    """
+    if today is None:
+        today = datetime.today().date()
+    until = today + timedelta(days=horizon)
+    variables = {
+        "today": day_start(today),
+        "until": day_start(until),
+        "limit": limit,
+        "offset": offset,
+    }
+    if since is not None:
+        variables["since"] = since.isoformat()
+    return variables
+
+
+def range_variables(start: date, end: date) -> dict:
+    """Values of the GraphQL variables of the events of [start, end)."""
+    return {"start": day_start(start), "end": day_start(end)}
+
+
+def fingerprint(body: bytes | str) -> str:
+    """Digest of a raw response body, equal bodies give equal fingerprints."""
+    if isinstance(body, str):
+        body = body.encode()
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def decode_response(body: bytes | str):
+    """Decode a raw response body, with orjson when it is installed."""
+    return json_loads(body)
+
+
+VALIDATE_QUERY = build_query("EetlijstValidate", ("info",))
+
+
+class PersistedQueries:
+    """Tracks which document hashes the server has seen.
+
+    Once the server answered a hash-only request with an error saying it does
+    not support persisted queries, the full documents are always sent. Any
+    other error is the answer to the request itself and is returned as is.
+    """
+
+    def __init__(self) -> None:
+        self.supported = True
+        self._registered: set[str] = set()
+
+    def use_hash(self, query: Query) -> bool:
+        """Whether to send only the hash of the document."""
+        return self.supported and query.sha256 in self._registered
+
+    def handle_response(self, query: Query, persisted: bool, respjson: dict) -> bool:
+        """Process a response, returns True if the request must be sent in full."""
+        errors = respjson.get("errors")
+        if not persisted:
+            if not errors:
+                self._registered.add(query.sha256)
+            return False
+        if not errors:
+            return False
+
+        keys = [
+            (error.get("extensions", {}).get("code"), error.get("message"))
+            for error in errors
+        ]
+        if any(
+            code in PERSISTED_QUERY_NOT_FOUND or message in PERSISTED_QUERY_NOT_FOUND
+            for code, message in keys
+        ):
+            self._registered.discard(query.sha256)
+            return True
+        if any(
+            code in PERSISTED_QUERY_NOT_SUPPORTED
+            or message in PERSISTED_QUERY_NOT_SUPPORTED
+            for code, message in keys
+        ):
+            self.supported = False
+            return True
+        return False
+
+
+PERSISTED_QUERIES = PersistedQueries()
@@ -1,7 +1,10 @@
 """Platform for sensor integration."""
 from homeassistant.helpers.entity import Entity
 from homeassistant.core import callback
+from homeassistant.helpers import entity_registry as er
 from .const import DOMAIN
+from .model import AttendanceStatus
+from functools import partial
 import logging
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
@@ -16,8 +19,6 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
     global ICON_BASE
     """Add sensors for passed config_entry in HA."""
     lijst = hass.data[DOMAIN][config_entry.entry_id]
-    await lijst.setuplijst()
-    await lijst.async_config_entry_first_refresh()
 
     try:
         if config_entry.data["use_external_url"]:
@@ -27,53 +28,168 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
     except Exception:
         pass
 
-    new_devices = [SensorBase(lijst)]   #Not sure why but async_add skips the first entity, so addeda dummy entity in there
-    new_devices.append(EetlijstInfo(lijst))
-    new_devices.append(EetlijstVandaag(lijst))
-    new_devices.append(ShoppingList(lijst))
-    for idx, person_id in enumerate(lijst._residents_ordered):
-        new_devices.append(EetlijstResident(eetlijst=lijst, person_id=person_id, sensor_idx=idx))
+    new_devices = [SensorBase(lijst, lijst.primary_group)]   #Not sure why but async_add skips the first entity, so addeda dummy entity in there
+    # One device with its own sensors per group the token sees
+    for group_id in lijst.groups:
+        new_devices.append(EetlijstInfo(lijst, group_id))
+        new_devices.append(EetlijstVandaag(lijst, group_id))
+        new_devices.append(ShoppingList(lijst, group_id))
+        for person_id, idx in lijst.resident_sensors[group_id].items():
+            new_devices.append(
+                EetlijstResident(
+                    eetlijst=lijst, group_id=group_id, person_id=person_id, sensor_idx=idx
+                )
+            )
 
     if new_devices:
-        async_add_entities(new_devices, update_before_add=True)
+        async_add_entities(new_devices)
+
+    @callback
+    def _async_roster_changed(group_id) -> None:
+        """Add and remove resident sensors in place when the roster changed."""
+        if lijst.data is None or group_id not in lijst.data:
+            return
+        (added, removed) = lijst.update_roster(lijst.data[group_id].group)
+        if removed:
+            registry = er.async_get(hass)
+            device_id = lijst.device_id(group_id)
+            for idx in removed:
+                entity_id = registry.async_get_entity_id(
+                    "sensor", DOMAIN, f"{device_id}_{idx}"
+                )
+                if entity_id is not None:
+                    registry.async_remove(entity_id)
+        if added:
+            _LOGGER.info(f"New residents on Eetlijst {lijst.groups[group_id].name}")
+            async_add_entities(
+                [
+                    EetlijstResident(
+                        eetlijst=lijst, group_id=group_id, person_id=person_id, sensor_idx=idx
+                    )
+                    for person_id, idx in added.items()
+                ]
+            )
+
+    # The roster is part of the group info, see LijstCoordinator.listener_slices
+    for group_id in lijst.groups:
+        config_entry.async_on_unload(
+            lijst.async_add_listener(
+                partial(_async_roster_changed, group_id), (group_id, "info")
+            )
+        )
 
 class SensorBase(CoordinatorEntity, Entity):
     """Base representation of a Hello World Sensor."""
 
     should_poll = False
 
-    def __init__(self, lijst):
-        """Initialize the sensor."""
-        super().__init__(lijst)
+    def __init__(self, lijst, group_id, context=None):
+        """Initialize the sensor.
+
+        context selects the slice of the group's data this sensor reads, the
+        coordinator only calls back when that slice changed.
+        """
+        if isinstance(context, tuple):
+            context = (group_id, *context)
+        elif context is not None:
+            context = (group_id, context)
+        super().__init__(lijst, context)
         self._eetlijst = lijst
+        self._group_id = group_id
+        self._device_id = lijst.device_id(group_id)
+        self._lijst_name = lijst.groups[group_id].name
+        self._last_written = None
         #self.idx = 0
 
     @property
     def device_info(self):
         """Information about this entity/device."""
         return {
-            "identifiers": {(DOMAIN, self._eetlijst._id)},
+            "identifiers": {(DOMAIN, self._device_id)},
             # If desired, the name for the device could be different to the entity
-            "name": self._eetlijst._name,
-            "model": self._eetlijst.model,
+            "name": f"Eetlijst {self._lijst_name}",
+            "model": self._lijst_name,
             "manufacturer": self._eetlijst.manufacturer,
         }
 
     @property
     def available(self) -> bool:
-        """Return True if roller and hub is available."""
+        """Return True while the data still holds the sensor's group."""
+        return self.lijst_data is not None
+
+    @property
+    def lijst_data(self):
+        """The coordinator data of this sensor's group.
+
+        None when the token no longer sees the group, see _async_roster_changed.
+        """
+        if self.coordinator.data is None:
+            return None
+        return self.coordinator.data.get(self._group_id)
+
+    async def async_added_to_hass(self) -> None:
+        """Fill in the state right away, the coordinator only calls back on changes."""
+        await super().async_added_to_hass()
+        if self.lijst_data is not None:
+            self._handle_coordinator_update()
+
+    @callback
+    def async_group_missing(self) -> bool:
+        """Write the sensor unavailable if its group is gone from the data.
+
+        A failing sensor would keep the coordinator from notifying the others,
+        so every update handler checks this first.
+        """
+        if self.lijst_data is not None:
+            return False
+        self.async_write_ha_state_if_changed()
         return True
 
+    def state_fingerprint(self) -> int:
+        """Cheap fingerprint of everything that ends up in the state machine."""
+        return hash(
+            repr(
+                (
+                    self.state,
+                    self.name,
+                    self.icon,
+                    self.entity_picture,
+                    self.unit_of_measurement,
+                    self.available,
+                    getattr(self, "state_attributes", None),
+                    self.extra_state_attributes,
+                )
+            )
+        )
+
+    @callback
+    def async_write_ha_state_if_changed(self) -> None:
+        """Only write the state if it differs from the last written one.
+
+        Every write fires a state_changed event and has the recorder store the
+        attributes again, so quiet refreshes should not write at all.
+        """
+        fingerprint = self.state_fingerprint()
+        if fingerprint == self._last_written:
+            return
+        self._last_written = fingerprint
+        self.async_write_ha_state()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
+        self.async_write_ha_state_if_changed()
+
 
 class EetlijstInfo(SensorBase):
     """Sensor with information about the Eetlijst."""
-    def __init__(self, eetlijst):
+    def __init__(self, eetlijst, group_id):
         """Initialize the sensor."""
-        super().__init__(eetlijst)
+        super().__init__(eetlijst, group_id, "info")
 
-        self._attr_unique_id = f"{self._eetlijst._id}_info"
+        self._attr_unique_id = f"{self._device_id}_info"
 
-        self._attr_name = f"Eetlijst {self._eetlijst.lijst_name} Info"
+        self._attr_name = f"Eetlijst {self._lijst_name} Info"
         self._attr_icon = "mdi:home-analytics"
         self._attr_state = None
         self._state = None
@@ -99,48 +215,32 @@ class EetlijstInfo(SensorBase):
     def _handle_coordinator_update(self) -> None:
         """Handle updated data from the coordinator."""
         #info = self._eetlijst.lijst_info
+        if self.async_group_missing():
+            return
         self._updates += 1
-        users_change = False
-        info = self.coordinator.data["info"]["eetschema_group"][0]
-        attr_dict = {}
-        attr_keys = ["city", "adress", "name"]
-        for key in attr_keys:
-            if key in info:
-                attr_dict[key] = info[key]
+        group = self.lijst_data.group
+        attr_dict = {"city": group.city, "name": group.name}
 
+        # Resident sensors of a changed roster are added and removed by the
+        # platform, see _async_roster_changed
         residents = []
-        for user in info["users_in_groups"]:
-            person = user["user"]["name"]
-            residents.append(person)
-            user_id = user["user"]["id"]
-            if user_id not in self.coordinator._residents_ordered:
-                users_change = True
-
-
-        if len(self.coordinator._residents_ordered) is not len(info["users_in_groups"]):
-            users_change = True
-
-        if users_change:
-            _LOGGER.warning("A change in the lijst users has been detected, reloading component")
-            self.hass.create_task(
-                self.hass.config_entries.async_reload(entry_id = self.coordinator.entry_id)
-            )
-            return
+        for resident in group.residents:
+            residents.append(resident.name)
 
         attr_dict["residents"] = residents
         self._attr_extra_state_attributes = attr_dict
         #self._attr_state = self._eetlijst.lijst_info["active"]
-        self._attr_state = info[ "active"]
-        self.async_write_ha_state()
+        self._attr_state = group.active
+        self.async_write_ha_state_if_changed()
 
 class EetlijstVandaag(SensorBase):
     """Sensor with information about today."""
-    def __init__(self, eetlijst):
+    def __init__(self, eetlijst, group_id):
         """Initialize the sensor."""
-        super().__init__(eetlijst)
+        super().__init__(eetlijst, group_id, "today")
 
-        self._attr_unique_id = f"{self._eetlijst._id}_today"
-        self._attr_name = f"Eetlijst {self._eetlijst.lijst_name} Today"
+        self._attr_unique_id = f"{self._device_id}_today"
+        self._attr_name = f"Eetlijst {self._lijst_name} Today"
 
         self._state = None
         self._extra_state_attributes = self.build_attr_dict()
@@ -166,48 +266,52 @@ class EetlijstVandaag(SensorBase):
     @callback
     def _handle_coordinator_update(self) -> None:
         """Handle updated data from the coordinator."""
+        if self.async_group_missing():
+            return
 
-        if len(self.coordinator.data["today"]["eetschema_event"]) < 1:
+        today = self.lijst_data.today
+        if today is None:
             LOGGER.debug("Eetschema event empty")
+            # No event (yet) for the new day, don't keep showing yesterday
+            self._state = None
+            self._extra_state_attributes = None
+            self._attr_entity_picture = None
+            self.async_write_ha_state_if_changed()
             return
 
-        today = self.coordinator.data["today"]["eetschema_event"][0]
         attr_dict = {"total eaters": 0, "Eating": [], "Shopping": [], "Not Eating": [], "Unknown": []}
         check_dict = ["Eating", "Shopping", "Not Eating", "Unknown"]
         cook = "Nobody"
-        for person_state in today["event_attendees_all_users"]:
-            person = person_state["user"]["name"]
-            person_eaters = 0
+        for attendance in today.attendees:
+            person = attendance.name
+            person_eaters = attendance.guests
             person_text = person
+            if person_eaters > 0:
+                person_text = f"{person} + {person_eaters}"
 
-            if isinstance(person_state["number_guests"], int):
-                if person_state["number_guests"] > 0:
-                    person_eaters = person_state["number_guests"]
-                    person_text = f"{person} + {person_eaters}"
-
-            if person_state["status"] == "cook":
+            if attendance.status is AttendanceStatus.COOK:
                 if cook == "Nobody":
                     cook = person
                 else:
                     cook = "Multiple People"
                 attr_dict["Eating"].append(person_text)
                 attr_dict["total eaters"] += 1 + person_eaters
-            elif person_state["status"] == "eat_only":
+            elif attendance.status is AttendanceStatus.EAT_ONLY:
                 attr_dict["Eating"].append(person_text)
                 attr_dict["total eaters"] += 1 + person_eaters
-            elif person_state["status"] == "got_groceries":
+            elif attendance.status is AttendanceStatus.GOT_GROCERIES:
                 attr_dict["Eating"].append(person_text)
                 attr_dict["Shopping"].append(person)
                 attr_dict["total eaters"] += 1 + person_eaters
-            elif person_state["status"] == "not_attending":
+            elif attendance.status is AttendanceStatus.NOT_ATTENDING:
                 attr_dict["Not Eating"].append(person)
             else:
                 attr_dict["Unknown"].append(person)
 
-        if today["description"] is not None:
-            attr_dict["Food"] = today["description"]
+        if today.description is not None:
+            attr_dict["Food"] = today.description
 
-        attr_dict["Open"] = today["open"]
+        attr_dict["Open"] = today.open
 
         for key in check_dict:
             if not attr_dict[key]:
@@ -225,23 +329,20 @@ class EetlijstVandaag(SensorBase):
                 self._attr_entity_picture = ICON_BASE.format("kok_on")
         else:
             self._attr_entity_picture = None
-        self.async_write_ha_state()
+        self.async_write_ha_state_if_changed()
 
     def build_attr_dict(self):
-        if len(self.coordinator.data["today"]["eetschema_event"]) < 1:
+        if self.lijst_data is None or self.lijst_data.today is None:
             return
-        # else:
-        #     print(self.coordinator.data["today"]["eetschema_event"])
+        today = self.lijst_data.today
 
-        today = self.coordinator.data["today"]["eetschema_event"][0]
         attr_dict = {"cook": "Nobody", "eaters": []}
-        for person_state in today["event_attendees_all_users"]:
-            person = person_state["user"]["name"]
-            if person_state["status"] == "cook":
-                attr_dict["cook"] = person
-                attr_dict["eaters"].append(person)
-            if person_state["status"] == "eat_only":
-                attr_dict["eaters"].append(person)
+        for attendance in today.attendees:
+            if attendance.status is AttendanceStatus.COOK:
+                attr_dict["cook"] = attendance.name
+                attr_dict["eaters"].append(attendance.name)
+            if attendance.status is AttendanceStatus.EAT_ONLY:
+                attr_dict["eaters"].append(attendance.name)
 
         return attr_dict
 
@@ -249,20 +350,17 @@ class EetlijstVandaag(SensorBase):
 class ShoppingList(SensorBase):
     """Eetlijst Shopping List Sensor."""
 
-    def __init__(self, eetlijst):
+    def __init__(self, eetlijst, group_id):
         """Initialize the sensor."""
         # In this sensor: handle extra people getting in/sensors changing?
-        super().__init__(eetlijst)
-        self._attr_unique_id = f"{self._eetlijst._id}_shopping_list"
+        super().__init__(eetlijst, group_id, "list")
+        self._attr_unique_id = f"{self._device_id}_shopping_list"
 
         # The name of the entity
-        self._attr_name = f"Eetlijst {self._eetlijst.lijst_name} Shopping List"
-        self._attr_state = len(self.coordinator.data["list"]["eetschema_list"])
+        self._attr_name = f"Eetlijst {self._lijst_name} Shopping List"
+        self._attr_state = None
         self._attr_icon = "mdi:cart"
-        shoplist = []
-        for item in self.coordinator.data["list"]["eetschema_list"]:
-            shoplist.append(item["text"])
-        self._attr_extra_state_attributes = {"Items": shoplist}
+        self._attr_extra_state_attributes = None
 
     @property
     def state(self):
@@ -278,27 +376,29 @@ class ShoppingList(SensorBase):
 
     @callback
     def _handle_coordinator_update(self) -> None:
-        self._attr_state = len(self.coordinator.data["list"]["eetschema_list"])
+        if self.async_group_missing():
+            return
+        self._attr_state = len(self.lijst_data.shopping)
         shoplist = []
-        for item in self.coordinator.data["list"]["eetschema_list"]:
-            shoplist.append(item["text"])
+        for item in self.lijst_data.shopping:
+            shoplist.append(item.text)
         self._attr_extra_state_attributes = {"Items": shoplist}
-        self.async_write_ha_state()
+        self.async_write_ha_state_if_changed()
 
 
 class EetlijstResident(SensorBase):
     """Eetlijst Resident Sensor."""
 
-    def __init__(self, eetlijst, person_id, sensor_idx):
-        super().__init__(eetlijst)
+    def __init__(self, eetlijst, group_id, person_id, sensor_idx):
+        super().__init__(eetlijst, group_id, ("resident", person_id))
 
         # unique id: use order?
         # As per the sensor, this must be a unique value within this domain. This is done
         # by using the device ID, and appending "_battery"
-        self._attr_unique_id = f"{self._eetlijst._id}_{sensor_idx}"
+        self._attr_unique_id = f"{self._device_id}_{sensor_idx}"
         #self._person_order = person_order
-        self._attr_name = f"Eetlijst {self._eetlijst.lijst_name} {sensor_idx}"
-        self._person_name = self._eetlijst._residents_ordered[person_id]
+        self._attr_name = f"Eetlijst {self._lijst_name} {sensor_idx}"
+        self._person_name = self._eetlijst.rosters[group_id][person_id]
         self._person_id = person_id #self._eetlijst._residents_ordered[person_order]["id"]
         self._attr_unit_of_measurement = self._person_name
         self._attr_device_class = "eetlijst_user"
@@ -342,68 +442,36 @@ class EetlijstResident(SensorBase):
 
     @callback
     def _handle_coordinator_update(self) -> None:
-        if self._person_id not in self.coordinator.data["future"]:
+        if self.async_group_missing():
+            return
+        if self._person_id not in self.lijst_data.residents:
             """Case for when the person has been removed, otherwise it throws an error"""
             pass
         else:
-
-            person_future = self.coordinator.data["future"][self._person_id]
-            self._attr_unit_of_measurement = self._person_name
+            resident = self.lijst_data.residents[self._person_id]
             attr_dict = {}
-            #print(f"Updating Person {self._person_name}")
             if self._eetlijst._config_options["show_balance"]:
-                for entry in self.coordinator.data["info"]["eetschema_group"][0]["summary"]:
-                    if entry["user_id"] == self._person_id:
-                        balance = entry["payed_total"] / 100
-                        attr_dict["Balance"] = f"€{balance:.2f}"
-
-            attr_dict["eetstatus_num"] = None
-            for day in person_future["next_week"]:
-
-                day_state = person_future["next_week"][day]
-                day_text = None if day_state["status"] == "dont_know_yet" else day_state["status"]
-                if day_text is None: day_text = "not_set"
-
-                if day_state["status"] == "cook" or day_state["status"] == "eat_only" or day_state["status"] == "got_groceries":
-                    if day == "Today":
-                        attr_dict["eetstatus_num"] = 1 if day_state["status"] == "cook" else -1
-
-                    if isinstance(day_state["number_guests"], int):
-                        if day_state["number_guests"] > 0:
-                            day_eaters = day_state["number_guests"]
-                            if day == "Today":
-                                attr_dict["eetstatus_num"] = 1 + day_eaters if day_state["status"] == "cook" else -1 - day_eaters
-                                self._attr_unit_of_measurement = f'{self._person_name} + {day_state["number_guests"]}'
-                            else:
-                                day_text = f"{day_text} + {day_eaters}"
-
-                if day == "Today":
-                    self._attr_state = day_text
-                    if day_state["status"] == "not_attending":
-                        attr_dict["eetstatus_num"] = 0
-                    elif day_state["status"] is None or day_state["status"] == "dont_know_yet":
-                        attr_dict["eetstatus_num"] = None
-                else:
-                    attr_dict[day] = day_text
-
-            if attr_dict["eetstatus_num"] == None:
-                self._attr_entity_picture = ICON_BASE.format("none")
+                if resident.balance is not None:
+                    balance = resident.balance / 100
+                    attr_dict["Balance"] = f"€{balance:.2f}"
+
+            attr_dict["eetstatus_num"] = resident.eetstatus_num
+            attr_dict.update(resident.days)
+
+            self._attr_state = resident.state
+            if resident.guests > 0:
+                self._attr_unit_of_measurement = (
+                    f"{self._person_name} + {resident.guests}"
+                )
             else:
-                if attr_dict["eetstatus_num"] > 4:
-                    eetnum = 5
-                elif attr_dict["eetstatus_num"] < -4:
-                    eetnum = -5
-                else:
-                    eetnum = attr_dict["eetstatus_num"]
-                if person_future["next_week"]["Today"]["status"] == "got_groceries":
-                    self._attr_entity_picture = ICON_BASE.format(f"shop_{eetnum}")
-                else:
-                    self._attr_entity_picture = ICON_BASE.format(eetnum)
+                self._attr_unit_of_measurement = self._person_name
 
-            if not self._eetlijst._config_options["custom_pictures"]:
+            if self._eetlijst._config_options["custom_pictures"]:
+                self._attr_entity_picture = ICON_BASE.format(resident.icon)
+            else:
                 self._attr_entity_picture = None
 
             self._attr_extra_state_attributes = attr_dict
             self._attr_name = f"Eetstatus {self._person_name}"
-            self.async_write_ha_state()
+            self.async_write_ha_state_if_changed()
         # Use an attr eetstatus_num as an integer value for the badge cards
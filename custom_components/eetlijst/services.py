@@ -0,0 +1,136 @@
+"""Services to write to the Eetlijst.
+
+Every call is sent as a single mutation. Its result is shown by the sensors
+right away and confirmed by one refresh afterwards, see
+LijstCoordinator._async_mutate.
+"""
+from __future__ import annotations
+
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.helpers.config_validation as cv
+
+from .const import DOMAIN
+from .model import AttendanceStatus
+
+SERVICE_SET_ATTENDANCE = "set_attendance"
+SERVICE_ADD_SHOPPING_ITEMS = "add_shopping_items"
+SERVICE_CHECK_SHOPPING_ITEMS = "check_shopping_items"
+
+ATTR_CONFIG_ENTRY_ID = "config_entry_id"
+ATTR_LIST = "list"
+ATTR_RESIDENTS = "residents"
+ATTR_DATES = "dates"
+ATTR_STATUS = "status"
+ATTR_GUESTS = "guests"
+ATTR_ITEMS = "items"
+
+TARGET_SCHEMA = {
+    vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+    vol.Optional(ATTR_LIST): cv.string,
+}
+
+SET_ATTENDANCE_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            **TARGET_SCHEMA,
+            vol.Required(ATTR_RESIDENTS): vol.All(cv.ensure_list, [cv.string]),
+            vol.Optional(ATTR_DATES): vol.All(cv.ensure_list, [cv.date]),
+            vol.Optional(ATTR_STATUS): vol.In(
+                [status.value for status in AttendanceStatus]
+            ),
+            vol.Optional(ATTR_GUESTS): vol.All(vol.Coerce(int), vol.Range(min=0)),
+        }
+    ),
+    cv.has_at_least_one_key(ATTR_STATUS, ATTR_GUESTS),
+)
+
+SHOPPING_ITEMS_SCHEMA = vol.Schema(
+    {
+        **TARGET_SCHEMA,
+        vol.Required(ATTR_ITEMS): vol.All(cv.ensure_list, [cv.string]),
+    }
+)
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the Eetlijst services, shared by all config entries."""
+
+    async def async_set_attendance(call: ServiceCall) -> None:
+        (coordinator, group_id) = resolve_target(hass, call)
+        user_ids = [
+            resolve_resident(coordinator, group_id, resident)
+            for resident in call.data[ATTR_RESIDENTS]
+        ]
+        await coordinator.async_set_attendance(
+            group_id,
+            user_ids,
+            call.data.get(ATTR_DATES) or [coordinator.today()],
+            call.data.get(ATTR_STATUS),
+            call.data.get(ATTR_GUESTS),
+        )
+
+    async def async_add_shopping_items(call: ServiceCall) -> None:
+        (coordinator, group_id) = resolve_target(hass, call)
+        await coordinator.async_add_shopping_items(group_id, call.data[ATTR_ITEMS])
+
+    async def async_check_shopping_items(call: ServiceCall) -> None:
+        (coordinator, group_id) = resolve_target(hass, call)
+        await coordinator.async_check_shopping_items(group_id, call.data[ATTR_ITEMS])
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_SET_ATTENDANCE, async_set_attendance, SET_ATTENDANCE_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_ADD_SHOPPING_ITEMS,
+        async_add_shopping_items,
+        SHOPPING_ITEMS_SCHEMA,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_CHECK_SHOPPING_ITEMS,
+        async_check_shopping_items,
+        SHOPPING_ITEMS_SCHEMA,
+    )
+
+
+def resolve_target(hass: HomeAssistant, call: ServiceCall):
+    """The coordinator and group a service call is meant for.
+
+    Without a config entry id there must be a single Eetlijst entry, without a
+    list name the call is for the entry's own list.
+    """
+    coordinators = hass.data.get(DOMAIN, {})
+    entry_id = call.data.get(ATTR_CONFIG_ENTRY_ID)
+    if entry_id is not None:
+        coordinator = coordinators.get(entry_id)
+        if coordinator is None:
+            raise HomeAssistantError(f"No loaded Eetlijst entry {entry_id}")
+    elif len(coordinators) == 1:
+        coordinator = next(iter(coordinators.values()))
+    else:
+        raise HomeAssistantError(
+            f"Several Eetlijst entries are loaded, pass {ATTR_CONFIG_ENTRY_ID}"
+        )
+
+    name = call.data.get(ATTR_LIST)
+    if name is None:
+        return (coordinator, coordinator.primary_group)
+    for group_id, group in coordinator.groups.items():
+        if group.name.casefold() == name.casefold():
+            return (coordinator, group_id)
+    raise HomeAssistantError(f"Unknown Eetlijst list {name}")
+
+
+def resolve_resident(coordinator, group_id, resident: str):
+    """The user id of a resident of the group, given by id or name."""
+    roster = coordinator.rosters[group_id]
+    if resident in roster:
+        return resident
+    for user_id, name in roster.items():
+        if name.casefold() == resident.casefold():
+            return user_id
+    raise HomeAssistantError(f"Unknown resident {resident}")
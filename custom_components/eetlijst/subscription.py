@@ -0,0 +1,243 @@
+"""GraphQL subscription transport for the Eetlijst API.
+
+Keeps a websocket open to the Hasura backend and pushes every change in the
+subscribed datasets straight into the coordinator, so changes made in the
+Eetlijst app show up without waiting for the next poll.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+
+import aiohttp
+
+from homeassistant.core import callback
+
+from .queries import (
+    AUTH_ERROR_CODES,
+    decode_response,
+    fingerprint,
+    query_variables,
+    response_keys,
+    subscription_query,
+)
+
+WSURL = "wss://api.samenn.nl/v1/graphql"
+WS_PROTOCOL = "graphql-transport-ws"
+
+# Datasets of the refresh query that are kept up to date over the socket
+SUBSCRIBED_DATASETS = ["today", "list", "future"]
+
+BACKOFF_MIN = 1
+BACKOFF_MAX = 300
+ACK_TIMEOUT = 10
+# Close codes of the protocol for a rejected token
+AUTH_CLOSE_CODES = (4401, 4403)
+# How often a quiet receive loop wakes up to check whether the day rolled over
+RECEIVE_TIMEOUT = 60
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class SubscriptionError(Exception):
+    """Error to indicate the subscription socket failed."""
+
+
+class SubscriptionAuthError(SubscriptionError):
+    """Error to indicate the server rejected the token."""
+
+
+def is_auth_rejection(errors) -> bool:
+    """Whether the errors of a message say the token was rejected."""
+    if not isinstance(errors, list):
+        errors = [errors]
+    return any(
+        isinstance(error, dict)
+        and error.get("extensions", {}).get("code") in AUTH_ERROR_CODES
+        for error in errors
+    )
+
+
+class LijstSubscription:
+    """Websocket subscriptions for a LijstCoordinator."""
+
+    def __init__(self, coordinator, url: str = WSURL) -> None:
+        self._coordinator = coordinator
+        self._url = url
+        self._task: asyncio.Task | None = None
+        self._backoff = BACKOFF_MIN
+        self._subscribed_day = None
+        self._subscribed = []
+        self.connected = False
+
+    @callback
+    def async_start(self) -> None:
+        """Start the subscription loop in the background."""
+        if self._task is not None:
+            return
+        self._task = self._coordinator.hass.async_create_background_task(
+            self._run(), f"Eetlijst subscription {self._coordinator.entry_id}"
+        )
+
+    @callback
+    def async_resubscribe(self) -> None:
+        """Renew the subscriptions at the next wake up, after the options changed."""
+        self._subscribed_day = None
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop the subscription loop and close the socket."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._set_connected(False)
+
+    async def _run(self) -> None:
+        """Keep the socket open, reconnecting with an exponential backoff."""
+        while True:
+            if self._coordinator.token_expired():
+                _LOGGER.debug("Eetlijst token expired, not reconnecting subscription")
+                self._set_connected(False)
+                return
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except SubscriptionAuthError as exce:
+                # Reconnecting is pointless, the poll starts the reauth flow
+                _LOGGER.warning(f"Eetlijst subscription rejected the token: {exce}")
+                self._coordinator.record_auth_failure(str(exce))
+                self._set_connected(False)
+                return
+            except (
+                aiohttp.ClientError,
+                asyncio.TimeoutError,
+                SubscriptionError,
+            ) as exce:
+                _LOGGER.debug(f"Eetlijst subscription dropped: {exce}")
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Unexpected error in the Eetlijst subscription")
+
+            self._set_connected(False)
+            delay = self._backoff * (1 + random.random()) / 2
+            self._backoff = min(self._backoff * 2, BACKOFF_MAX)
+            _LOGGER.debug(f"Reconnecting Eetlijst subscription in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _listen(self) -> None:
+        session = self._coordinator._session
+        async with session.ws_connect(
+            self._url, protocols=(WS_PROTOCOL,), heartbeat=30
+        ) as ws:
+            await ws.send_json(
+                {
+                    "type": "connection_init",
+                    "payload": {"headers": self._coordinator.api_headers},
+                }
+            )
+            msg = await ws.receive(timeout=ACK_TIMEOUT)
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                self._raise_closed(msg)
+            msg = decode_response(msg.data)
+            if msg.get("type") != "connection_ack":
+                if is_auth_rejection(msg.get("payload")):
+                    raise SubscriptionAuthError(f"Connection not acknowledged: {msg}")
+                raise SubscriptionError(f"Connection not acknowledged: {msg}")
+
+            # Connected, and the backoff reset, once the first result arrives
+            await self._subscribe(ws)
+
+            while True:
+                try:
+                    msg = await ws.receive(timeout=RECEIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    msg = None
+                if self._subscribed_day != self._coordinator.today():
+                    await self._resubscribe(ws)
+                if msg is None:
+                    continue
+
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    self._raise_closed(msg)
+                digest = fingerprint(msg.data)
+                if self._coordinator.is_known_push(digest):
+                    continue
+                await self._handle_message(ws, decode_response(msg.data), digest)
+
+    async def _subscribe(self, ws) -> None:
+        """Subscribe to each dataset with the same selection the poll uses."""
+        self._subscribed_day = self._coordinator.today()
+        # A subscription cannot be paged, it covers the whole horizon at once
+        horizon = self._coordinator.horizon
+        variables = query_variables(
+            horizon, limit=horizon, today=self._subscribed_day
+        )
+        features = self._coordinator.enabled_features()
+        fields = self._coordinator.query_fields(features)
+        groups = self._coordinator.query_groups()
+        self._subscribed = []
+        for alias in self._coordinator.needed_datasets(features):
+            if alias not in SUBSCRIBED_DATASETS:
+                continue
+            # One subscription per group, with the key of the polled response
+            for key, idx in response_keys(alias, groups):
+                group = groups[idx : idx + 1] if idx is not None else ()
+                await self._send_subscribe(
+                    ws, key, subscription_query(alias, fields, group), variables
+                )
+                self._subscribed.append(key)
+
+    async def _send_subscribe(self, ws, key, query, variables) -> None:
+        await ws.send_json(
+            {
+                "id": key,
+                "type": "subscribe",
+                "payload": {
+                    "query": query.document,
+                    "variables": {name: variables[name] for name in query.variables},
+                },
+            }
+        )
+
+    async def _resubscribe(self, ws) -> None:
+        """Renew the date bound subscriptions after the day rolled over."""
+        for alias in self._subscribed:
+            await ws.send_json({"id": alias, "type": "complete"})
+        await self._subscribe(ws)
+
+    async def _handle_message(self, ws, msg: dict, digest=None) -> None:
+        msg_type = msg.get("type")
+        if msg_type == "next":
+            payload = msg.get("payload", {})
+            if "errors" in payload:
+                if is_auth_rejection(payload["errors"]):
+                    raise SubscriptionAuthError(f"Subscription error: {payload}")
+                raise SubscriptionError(f"Subscription error: {payload['errors']}")
+            if not self.connected:
+                # The server accepted the subscriptions
+                self._backoff = BACKOFF_MIN
+                self._set_connected(True)
+            self._coordinator.async_set_subscription_data(
+                msg["id"], payload["data"], digest
+            )
+        elif msg_type == "ping":
+            await ws.send_json({"type": "pong"})
+        elif msg_type in ("error", "complete"):
+            if is_auth_rejection(msg.get("payload")):
+                raise SubscriptionAuthError(f"Subscription {msg.get('id')}: {msg}")
+            raise SubscriptionError(f"Subscription {msg.get('id')} ended: {msg}")
+
+    @staticmethod
+    def _raise_closed(msg) -> None:
+        """Raise for a close or error frame, rejected tokens have their own codes."""
+        if msg.type == aiohttp.WSMsgType.CLOSE and msg.data in AUTH_CLOSE_CODES:
+            raise SubscriptionAuthError(f"Socket closed with {msg.data}: {msg.extra}")
+        raise SubscriptionError(f"Socket closed with {msg.type}")
+
+    @callback
+    def _set_connected(self, connected: bool) -> None:
+        if connected is self.connected:
+            return
+        self.connected = connected
+        self._coordinator.async_subscription_state(connected)
@@ -0,0 +1,105 @@
+"""Platform for todo integration."""
+from __future__ import annotations
+
+from homeassistant.components.todo import (
+    TodoItem,
+    TodoItemStatus,
+    TodoListEntity,
+    TodoListEntityFeature,
+)
+from homeassistant.core import callback
+from homeassistant.exceptions import HomeAssistantError
+
+from .const import DOMAIN
+from .sensor import SensorBase
+
+
+async def async_setup_entry(hass, config_entry, async_add_entities):
+    """Add a shopping list todo entity per group for passed config_entry in HA."""
+    lijst = hass.data[DOMAIN][config_entry.entry_id]
+    async_add_entities(
+        [EetlijstShoppingTodo(lijst, group_id) for group_id in lijst.groups]
+    )
+
+
+class EetlijstShoppingTodo(SensorBase, TodoListEntity):
+    """The shopping list of a group as a todo list.
+
+    Checked off items are not fetched, so they disappear from the list.
+    """
+
+    _attr_supported_features = (
+        TodoListEntityFeature.CREATE_TODO_ITEM
+        | TodoListEntityFeature.UPDATE_TODO_ITEM
+        | TodoListEntityFeature.DELETE_TODO_ITEM
+    )
+
+    def __init__(self, eetlijst, group_id):
+        """Initialize the todo list."""
+        super().__init__(eetlijst, group_id, "list")
+        self._attr_unique_id = f"{self._device_id}_shopping_todo"
+        self._attr_name = f"Eetlijst {self._lijst_name} Shopping List"
+        self._attr_icon = "mdi:cart"
+        self._attr_todo_items = []
+        # API id per todo item uid
+        self._item_ids = {}
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Apply the added, changed and removed items to the todo items.
+
+        Unchanged items keep their TodoItem and the state is only written when
+        an item changed.
+        """
+        if self.async_group_missing():
+            return
+        current = {item.uid: item for item in self._attr_todo_items}
+        items = []
+        item_ids = {}
+        for idx, item in enumerate(self.lijst_data.shopping):
+            # Items added from Home Assistant get their id with the next refresh
+            uid = str(item.id) if item.id is not None else f"new_{idx}"
+            item_ids[uid] = item.id
+            todo_item = current.get(uid)
+            if todo_item is None or todo_item.summary != item.text:
+                todo_item = TodoItem(
+                    summary=item.text, uid=uid, status=TodoItemStatus.NEEDS_ACTION
+                )
+            items.append(todo_item)
+        self._item_ids = item_ids
+        if items == self._attr_todo_items:
+            return
+        self._attr_todo_items = items
+        self.async_write_ha_state()
+
+    def _item_id(self, uid):
+        item_id = self._item_ids.get(uid)
+        if item_id is None:
+            raise HomeAssistantError(f"Shopping list item {uid} is not saved yet")
+        return item_id
+
+    async def async_create_todo_item(self, item: TodoItem) -> None:
+        """Add an item to the shopping list."""
+        await self.coordinator.async_add_shopping_items(self._group_id, [item.summary])
+
+    async def async_update_todo_item(self, item: TodoItem) -> None:
+        """Rename or check off an item of the shopping list."""
+        changes = {}
+        if item.status == TodoItemStatus.COMPLETED:
+            changes["checked"] = True
+        current = next(
+            (todo for todo in self._attr_todo_items if todo.uid == item.uid), None
+        )
+        if item.summary and (current is None or item.summary != current.summary):
+            changes["text"] = item.summary
+        if not changes:
+            return
+        await self.coordinator.async_update_shopping_items(
+            self._group_id, [self._item_id(item.uid)], **changes
+        )
+
+    async def async_delete_todo_items(self, uids: list[str]) -> None:
+        """Remove items from the shopping list."""
+        await self.coordinator.async_update_shopping_items(
+            self._group_id, [self._item_id(uid) for uid in uids], active=False
+        )